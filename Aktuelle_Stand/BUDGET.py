@@ -0,0 +1,170 @@
+import threading
+from concurrent.futures import CancelledError
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# USD per 1M tokens as (prompt, completion) of every model the pipeline uses. Models without an entry are tracked in
+# tokens only and a warning is printed if a cost limit is set, their cost would otherwise count as zero.
+MODEL_PRICES = {
+    "openai:gpt-5.2": (1.75, 14.00),
+    "openai:gpt-4o": (2.50, 10.00),
+    "openai:gpt-4o-mini": (0.15, 0.60),
+    "google:gemini-1.5-pro": (1.25, 5.00),
+    "google:gemini-1.5-flash": (0.075, 0.30),
+    "mock:hara": (1.00, 1.00),
+}
+
+# Model used instead once a soft limit is reached
+CHEAPER_MODELS = {
+    "openai:gpt-5.2": "openai:gpt-4o-mini",
+    "openai:gpt-4o": "openai:gpt-4o-mini",
+    "google:gemini-1.5-pro": "google:gemini-1.5-flash",
+}
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+class RunBudget:
+    """
+    Accumulates the token usage and estimated cost of one pipeline run.
+    Reaching a soft limit downgrades requests to a cheaper model, reaching a hard limit rejects further requests
+    with BudgetExceeded so fan-out steps can stop and keep their partial results.
+    """
+
+    def __init__(self, soft_tokens: Optional[int] = None, hard_tokens: Optional[int] = None,
+                 soft_cost: Optional[float] = None, hard_cost: Optional[float] = None,
+                 prices: Dict = MODEL_PRICES, downgrades: Dict = CHEAPER_MODELS):
+        self.soft_tokens = soft_tokens
+        self.hard_tokens = hard_tokens
+        self.soft_cost = soft_cost
+        self.hard_cost = hard_cost
+        self.prices = prices
+        self.downgrades = downgrades
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.requests = 0
+        self.rejected = 0
+        self.unpriced = set()
+        self._lock = threading.Lock()
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    @staticmethod
+    def _reached(value, limit) -> bool:
+        return limit is not None and value >= limit
+
+    @property
+    def soft_exceeded(self) -> bool:
+        return self._reached(self.total_tokens, self.soft_tokens) or self._reached(self.cost, self.soft_cost)
+
+    @property
+    def hard_exceeded(self) -> bool:
+        return self._reached(self.total_tokens, self.hard_tokens) or self._reached(self.cost, self.hard_cost)
+
+    def check(self):
+        with self._lock:
+            exceeded = self.hard_exceeded
+            if exceeded:
+                self.rejected += 1
+                message = f"Run budget exhausted after {self.total_tokens} tokens (${self.cost:.4f})"
+        if exceeded:
+            raise BudgetExceeded(message)
+
+    def select_model(self, model: str) -> str:
+        with self._lock:
+            soft_exceeded = self.soft_exceeded
+        return self.downgrades.get(model, model) if soft_exceeded else model
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int):
+        if model not in self.prices and model not in self.unpriced:
+            self.unpriced.add(model)
+            if self.soft_cost is not None or self.hard_cost is not None:
+                print(f"Warning: No price for {model}, its requests do not count against the cost limits.")
+        prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.cost += (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+    # Read the token counts from an OpenAI or Anthropic style usage field
+    def record_usage(self, model: str, usage):
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or getattr(usage, "input_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", None) or getattr(usage, "output_tokens", 0) or 0
+        self.record(model, prompt_tokens, completion_tokens)
+
+    def summary(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "estimated_cost": round(self.cost, 6),
+        }
+
+
+_active_budget: Optional[RunBudget] = None
+
+
+# The budget of the current run. A module global instead of a context variable so fan-out threads share it.
+def current_budget() -> Optional[RunBudget]:
+    return _active_budget
+
+
+@contextmanager
+def run_budget(budget: RunBudget):
+    global _active_budget
+    previous = _active_budget
+    _active_budget = budget
+    try:
+        yield budget
+    finally:
+        _active_budget = previous
+
+
+# Wait for a {key: [futures]} fan-out. If the budget runs out, queued work is cancelled and the results that already
+# arrived are kept. Every list keeps the positions of its submitted futures: a cancelled or rejected future leaves None
+# in its slot, so callers must map results by index and check for None instead of zipping or counting the lists.
+def collect_futures(executor, collector: Dict[str, List]) -> Dict[str, List]:
+    results = {}
+    aborted = False
+    for key, futures in collector.items():
+        results[key] = []
+        for future in futures:
+            try:
+                results[key].append(future.result())
+            except CancelledError:
+                results[key].append(None)
+            except BudgetExceeded as e:
+                results[key].append(None)
+                if not aborted:
+                    print(f"Warning: {e}. Cancelling queued requests and keeping partial results.")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    aborted = True
+    return results
+
+
+# The results of collect_futures without the slots of dropped futures
+def completed(results: Dict[str, List]) -> Dict[str, List]:
+    return {key: [result for result in values if result is not None] for key, values in results.items()}
+
+
+if __name__ == "__main__":
+    # Exercise the budget against the mock backend. Import through the module name, HELPERS reads the budget there.
+    import HARA
+    from BUDGET import RunBudget, run_budget
+
+    system = {"name": "Electronic Parking Brake", "description": "Locks the rear wheels of a stationary vehicle."}
+    persons = [{"name": f"Person {i}", "role": "Uses the vehicle."} for i in range(8)]
+    hazards = ["Mechanical", "Kinetic", "Electrical", "Thermal"]
+    with run_budget(RunBudget(soft_tokens=4_000, hard_tokens=8_000)) as budget:
+        harms = HARA.harms(system, persons, hazards, model="mock:hara")
+    print(f"Harms kept: {sum(len(h) for h in harms.values())} of {len(persons) * len(hazards)}")
+    print(budget.summary())
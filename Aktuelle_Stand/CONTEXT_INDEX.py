@@ -0,0 +1,175 @@
+import json
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Tuple
+from JSON_PATCH import to_pointer
+
+# Retrieval of the parts of an analysis a feedback query refers to. The analysis is split into records (a person,
+# a hazard class, a harm, a rating, ...) addressed by JSON pointers, which are ranked by BM25 and, if
+# sentence-transformers is installed, by embedding similarity. Only the best records are put into the prompt, unless
+# the query is a bulk edit ("remove all ...") or matches more records than fit in, then the full analysis is sent.
+
+# Analyses smaller than this are still sent in full
+FULL_CONTEXT_CHARS = 6000
+TOP_K = 8
+# Records scoring at least this fraction of the best BM25 score count as matches of the query
+MATCH_FRACTION = 0.5
+INDEX_CACHE_SIZE = 4
+_BULK = re.compile(r"\b(all|every|each|everything|everyone|entire|whole)\b", re.IGNORECASE)
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_WEIGHT = 0.5
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+def _is_scalar(value: Any) -> bool:
+    return not isinstance(value, (dict, list))
+
+
+# A record is a scalar in a list or a container whose values are scalars or lists of scalars
+def _is_record(value: Any) -> bool:
+    if _is_scalar(value):
+        return True
+    values = value.values() if isinstance(value, dict) else value
+    return all(_is_scalar(v) or (isinstance(v, list) and all(_is_scalar(x) for x in v)) for v in values)
+
+
+def iter_records(node: Any, path: Tuple = ()) -> List[Tuple[Tuple, Any]]:
+    if path and _is_record(node):
+        return [(path, node)]
+    if isinstance(node, dict):
+        items = node.items()
+    elif isinstance(node, list):
+        items = enumerate(node)
+    else:
+        return [(path, node)]
+    records = []
+    for key, value in items:
+        records.extend(iter_records(value, path + (key,)))
+    return records
+
+
+class ContextIndex:
+    def __init__(self, analysis: Any, embedder=None):
+        self.analysis = analysis
+        self.records = iter_records(analysis)
+        self.texts = [" ".join(str(p) for p in path) + " " + json.dumps(value) for path, value in self.records]
+        self.term_counts = [Counter(_tokens(text)) for text in self.texts]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.document_frequency = Counter()
+        for counts in self.term_counts:
+            self.document_frequency.update(counts.keys())
+        self.embedder = embedder
+        self.embeddings = embedder.encode(self.texts, normalize_embeddings=True) if embedder and self.texts else None
+
+    def _bm25(self, query: str, k1: float = 1.5, b: float = 0.75) -> List[float]:
+        n = len(self.records)
+        scores = [0.0] * n
+        for term in set(_tokens(query)):
+            frequency = self.document_frequency.get(term)
+            if not frequency:
+                continue
+            idf = math.log(1 + (n - frequency + 0.5) / (frequency + 0.5))
+            for i, counts in enumerate(self.term_counts):
+                tf = counts.get(term)
+                if tf:
+                    norm = k1 * (1 - b + b * self.lengths[i] / (self.average_length or 1))
+                    scores[i] += idf * tf * (k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query: str, k: int = TOP_K) -> List[Tuple[str, Any]]:
+        scores = self._bm25(query)
+        best = max(scores, default=0.0) or 1.0
+        scores = [score / best for score in scores]
+        if self.embeddings is not None:
+            query_embedding = self.embedder.encode([query], normalize_embeddings=True)[0]
+            similarities = self.embeddings @ query_embedding
+            scores = [score + EMBEDDING_WEIGHT * float(sim) for score, sim in zip(scores, similarities)]
+        ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        return [(to_pointer(self.records[i][0]), self.records[i][1]) for i in ranked[:k] if scores[i] > 0]
+
+    # Number of records the query clearly refers to, by the lexical score only
+    def matches(self, query: str, fraction: float = MATCH_FRACTION) -> int:
+        scores = self._bm25(query)
+        best = max(scores, default=0.0)
+        return sum(score >= fraction * best for score in scores) if best > 0 else 0
+
+
+_embedder = None
+_index_cache: "OrderedDict[int, ContextIndex]" = OrderedDict()
+_index_lock = threading.Lock()
+
+
+_embedder_lock = threading.Lock()
+
+
+# The embedding model, loaded once; without sentence-transformers or the model files the index is BM25 only
+def _load_embedder():
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+                _embedder = SentenceTransformer(EMBEDDING_MODEL)
+            except ImportError:
+                _embedder = False
+            except (OSError, RuntimeError, ValueError) as e:
+                print(f"Warning: Could not load the embedding model {EMBEDDING_MODEL}, using BM25 only: {e}")
+                _embedder = False
+    return _embedder or None
+
+
+# The indices of the last INDEX_CACHE_SIZE documents are kept, the feedback loop alternates between the analysis
+# and its working copy
+def get_index(analysis: Any) -> ContextIndex:
+    with _index_lock:
+        index = _index_cache.get(id(analysis))
+        if index is not None and index.analysis is analysis:
+            _index_cache.move_to_end(id(analysis))
+            return index
+    index = ContextIndex(analysis, _load_embedder())
+    with _index_lock:
+        _index_cache[id(analysis)] = index
+        _index_cache.move_to_end(id(analysis))
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+OUTLINE_KEYS = 20
+
+
+# Lengths and keys of the containers, so the model can address entries it does not see (e.g. "/-" to append)
+def outline(node: Any, path: Tuple = (), depth: int = 2) -> List[str]:
+    if _is_scalar(node) or depth == 0:
+        return []
+    if isinstance(node, list):
+        return [f"{to_pointer(path) or '/'}: array with {len(node)} entries"]
+    keys = list(node.keys())
+    shown = keys[:OUTLINE_KEYS] + ([f"... {len(keys) - OUTLINE_KEYS} more"] if len(keys) > OUTLINE_KEYS else [])
+    lines = [f"{to_pointer(path) or '/'}: object with keys {shown}"]
+    for key in keys[:OUTLINE_KEYS]:
+        lines.extend(outline(node[key], path + (key,), depth - 1))
+    return lines
+
+
+# Describe the analysis for a prompt: the full JSON if it is small, otherwise an outline plus the relevant records.
+# Bulk queries and queries matching more than k records get the full JSON, an excerpt would make the edit partial.
+def describe_context(analysis: Any, query: str, k: int = TOP_K) -> str:
+    full = json.dumps(analysis)
+    if len(full) <= FULL_CONTEXT_CHARS or _BULK.search(query):
+        return full
+    index = get_index(analysis)
+    if index.matches(query) > k:
+        return full
+    records = index.search(query, k)
+    excerpt = "\n".join(f"{pointer}: {json.dumps(value)}" for pointer, value in records)
+    return (f"(excerpt of a larger JSON document)\nSTRUCTURE:\n" + "\n".join(outline(analysis)) +
+            f"\nRELEVANT ENTRIES (JSON pointer: value):\n{excerpt or 'No matching entries'}")
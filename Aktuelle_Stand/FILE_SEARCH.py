@@ -1,21 +1,31 @@
-import aisuite as ai
-from dotenv import load_dotenv
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from HELPERS import *
-
-_ = load_dotenv()
-client = ai.Client()
+from ROUTING import run_chat_cascade
+from INTENT import classify_intent, log_query
+from JSON_PATCH import apply_patch, JSONPatchError
+from CONTEXT_INDEX import describe_context
+from QUERY_ENGINE import answer_query
 
 
 # Identify the request type and content
+# The local classifier answers confident queries, the LLM is only called for the rest.
+# Without an explicit model the query is routed through the fast model first, see ROUTING.STEP_MODELS
 def query_detection_LLM(user_query: str, anaylsis: json, previous_queries: list, task_description: str,
-                        model = "openai:gpt-5.2"):
+                        model: str = None, local: bool = True):
+    if local:
+        response = classify_intent(user_query)
+        if response is not None:
+            return response
     if task_description == "HARA":
         task_description = \
             "You are an expert in HARA analysis who has to review a HARA analysis and execute queries on it."
     elif task_description == "RISK":
         task_description = "You are an expert in functional safety engineering and execute queries on it."
+    # Large analyses are reduced to the entries the query refers to
+    context = describe_context(anaylsis, " ".join([user_query] + [str(q) for q in previous_queries]))
     messages = [
         {
             "role": "system",
@@ -23,7 +33,7 @@ def query_detection_LLM(user_query: str, anaylsis: json, previous_queries: list,
             TASK:
             - {task_description}
             - Classify the user's intent as: delete, get, post, refactor or clarification.
-            - The request is referring to the following JSON object: {anaylsis}
+            - The request is referring to the following JSON object: {context}
             - The conversation history with the past user querys: 
               {previous_queries if len(previous_queries) > 0 else "No previous queries"}
             
@@ -44,11 +54,72 @@ def query_detection_LLM(user_query: str, anaylsis: json, previous_queries: list,
         }
     ]
     messages.append({"role": "user", "content": user_query})
-    return run_chat(messages, model, "json")
+    if model is None:
+        response = run_chat_cascade("query_detection", messages, "json", user_query=user_query)
+    else:
+        response = run_chat(messages, model, "json")
+    log_query(user_query, response)
+    return response
+
+
+# Let the LLM describe the edits as RFC 6902 JSON Patch operations and apply them locally, so the output size
+# scales with the change instead of the document. Returns None if the patch is invalid.
+def patch_querys(user_querys: list[dict], analysis: json, model="openai:gpt-5.2"):
+    context = describe_context(analysis, " ".join(str(q.get("content", q)) if isinstance(q, dict) else str(q)
+                                                  for q in user_querys))
+    messages = [
+        {"role": "system",
+         "content": f"""
+         Task: 
+         - You get a list of user querys which you have to execute on this JSON document: {context}
+         - Express the execution as edit operations on the document instead of returning the modified document
+         
+         Definitions:
+         - post = add or generate new info to everything which is affected by the content description
+         - delete = remove everything which is affected by the content description while maintaining every information
+           which is related to something not mentioned in the content description
+         - refactor = correct, improve, or update existing info depending on the content description and substitute the 
+           old information through the upgraded version
+         - clarification = can be skipped
+         
+         Rules:
+         - Paths are JSON pointers into the document, e.g. "/0/name" or "/Driver/2/harm"
+         - Use "add" with the path "/-" or "/<list path>/-" to append to a list
+         - Operations are applied in order, so indices of later operations refer to the already modified document
+         - New values must keep the exact style of the existing entries
+            
+         JSON FORMAT:
+         - Return only a valid JSON array of RFC 6902 JSON Patch operations, e.g.
+           [{{"op": "replace", "path": "/0/name", "value": "Pilot"}}, {{"op": "remove", "path": "/3"}}]
+        """}
+    ]
+    messages.append({"role": "user", "content": f"""{user_querys}"""})
+    # Not run_chat: its empty fallback [] is a valid patch that changes nothing, the edit would be lost silently
+    try:
+        patch = parse_json(complete_chat(messages, model))
+    except BudgetExceeded:
+        raise
+    except Exception as e:
+        print(f"Warning: No patch from {model}: {e}")
+        return None
+    if not isinstance(patch, list) or not patch or not all(isinstance(op, dict) for op in patch):
+        print(f"Warning: No patch operations from {model}, regenerating the document.")
+        return None
+    try:
+        return apply_patch(analysis, patch)
+    except JSONPatchError as e:
+        print(f"Warning: Invalid patch from {model}: {e}")
+        return None
 
 
-# Full replacement function, unfinished
-def complete_querys(user_querys: list[dict], analysis: json, hazards=False, model="openai:gpt-5.2"):
+# Execute the queries on the analysis. The patch mode is used unless the result has a different shape (hazards),
+# and falls back to regenerating the full document if the patch can not be applied.
+def complete_querys(user_querys: list[dict], analysis: json, hazards=False, model="openai:gpt-5.2",
+                    edit_mode: str = "patch"):
+    if edit_mode == "patch" and not hazards:
+        patched = patch_querys(user_querys, analysis, model=model)
+        if patched is not None:
+            return patched
     if hazards:
         format_requirements = f"""JSON FORMAT:
                                   - Return a JSON containing the hazards as keys and values for each hazard"""
@@ -78,6 +149,92 @@ def complete_querys(user_querys: list[dict], analysis: json, hazards=False, mode
     return run_chat(messages, model, "json")
 
 
+class FeedbackPipeline:
+    """
+    Classifies and applies feedback queries in the background while the user keeps typing.
+    Every query is classified as soon as it is submitted and, unless it needs clarification, applied to a working
+    copy of the analysis in submission order. Retrieval ("get") queries are answered by the local query engine.
+    result() therefore only waits for the queries still in flight.
+    With apply_each=False (hazard classes, whose result has a different shape) the classified queries are applied
+    together in result() as before.
+    """
+
+    def __init__(self, analysis: json, backend: str, apply_each: bool = True):
+        self.analysis = analysis
+        self.working = analysis
+        self.backend = backend
+        self.apply_each = apply_each
+        self.previous_querys = []
+        self.query_history = []
+        self._classified = []
+        self._reported = 0
+        self._futures = []
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._classifier = ThreadPoolExecutor(max_workers=max_concurrency())
+        # A single worker keeps the provisional edits in submission order
+        self._applier = ThreadPoolExecutor(max_workers=1)
+
+    def submit(self, user_query: str):
+        previous = list(self.previous_querys)
+        self.previous_querys.append(user_query)
+        classification = self._classifier.submit(query_detection_LLM, user_query, self.analysis, previous,
+                                                 task_description=self.backend)
+        self._futures.append(self._applier.submit(self._apply, user_query, classification))
+
+    def _apply(self, user_query: str, classification):
+        if self._cancelled:
+            return
+        try:
+            response = classification.result()
+        except Exception as e:
+            print(f"Error classifying query {user_query!r}: {e}")
+            response = {}
+        if not isinstance(response, dict) or "type" not in response:
+            response = {"type": "clarification", "content": "The request could not be processed, please rephrase it."}
+        if response["type"] == "get":
+            # Retrieval is answered from the local query engine and does not modify the analysis
+            response["answer"] = answer_query(response.get("content") or user_query, self.working)
+        elif response["type"] != "clarification":
+            self.query_history.append(response)
+            if self.apply_each:
+                try:
+                    updated = complete_querys([response], self.working)
+                    # An empty document is a valid result of a delete, for other queries it is a failed request
+                    if updated is not None and type(updated) is type(self.working) and \
+                            (updated or response["type"] == "delete") and not self._cancelled:
+                        self.working = updated
+                except Exception as e:
+                    print(f"Error applying query {user_query!r}: {e}")
+        with self._lock:
+            self._classified.append((user_query, response))
+
+    # Queries classified since the last call, as (query, response) pairs
+    def completed(self, block: bool = False) -> list:
+        if block:
+            wait(self._futures)
+        with self._lock:
+            new = self._classified[self._reported:]
+            self._reported = len(self._classified)
+        return new
+
+    # Abort: queries not yet classified or applied are dropped and no further edits reach the working copy
+    def cancel(self):
+        self._cancelled = True
+        for future in self._futures:
+            future.cancel()
+        self._classifier.shutdown(wait=False, cancel_futures=True)
+        self._applier.shutdown(wait=False, cancel_futures=True)
+
+    def result(self) -> json:
+        wait(self._futures)
+        self._classifier.shutdown()
+        self._applier.shutdown()
+        if self.apply_each or len(self.query_history) == 0:
+            return self.working
+        return complete_querys(self.query_history, self.analysis, hazards=True)
+
+
 # Load the information from the JSON file
 def load_file(file_name: str):
     path = os.path.join(os.path.dirname(__file__), file_name)
@@ -1,26 +1,18 @@
 import re
-import aisuite as ai
-from dotenv import load_dotenv
 import json
 import os
 import ast
-from pip._internal.index import collector
 from typing import List, Dict, Any
 from HELPERS import *
-from rich.console import Console
-from rich.table import Table
-from rich.panel import Panel
+from PLAUSIBILITY import plausible_pairs, report_pruned
+from RELEVANCE import rank_cells
+from MODEL import HaraStore
 from concurrent.futures import ThreadPoolExecutor
 
 # added semantic embeddings - pip install sentence-transformers scikit-learn
 # from sentence_transformers import SentenceTransformer
 # from sklearn.cluster import DBSCAN
 
-console = Console()
-
-_ = load_dotenv()
-client = ai.Client()
-
 
 def extract_system(user_input: str, model: str = "google:gemini-1.5-pro"):
     system_prompt = {
@@ -274,23 +266,133 @@ def define_harm(system: json, person: str, hazard_class: str, model: str = "goog
 
     return response
 
+HARM_BATCH_SIZE = 12
+
+
+def valid_harm(entry: Dict[str, Any]) -> bool:
+    return isinstance(entry, dict) and isinstance(entry.get("harm"), str) and entry["harm"].strip() != ""
+
+
+# Define the harms of one person for a list of hazard classes in a single request
+def define_harms_batch(system: json, person: str, hazard_classes: List[str], model: str = "google:gemini-1.5-pro"):
+    system_prompt = {
+        "role": "system",
+        "content": f"""
+        You are an expert in Hazard Analysis and Risk Assessment (HARA). 
+
+        TASK: 
+        Based on the provided system description, person, and a numbered list of hazard classes, answer the guide phrase for EVERY hazard class: How could the <<system>> potentially cause harm to the <<person>> through <<hazard class>>?
+
+        CRITICAL OUTPUT RULE:
+        The 'harm' value must be a concise, general description of the harm caused. Do not use specific person names, and do not include the ultimate consequence (e.g., 'Death', 'Amputation').
+        Do not give any reasons as well, only consider the harm done. So for example, instead of 'Electric shock or electrical burns from contact with exposed or damaged robot wiring, connectors, or end-effector electronics during inspection.', just return 'Electric shock or electrical burns'.
+
+        OUTPUT FORMAT:
+        Return only a valid JSON array with one element per hazard class, where each element has exactly these keys:
+        - "idx": (integer, the number of the hazard class in the given list)
+        - "guide_phrase": (string, the filled guide phrase)
+        - "hazard_class": (string)
+        - "person": (string)
+        - "harm": (string)
+        """}
+
+    few_shot_user = {
+        "role": "user",
+        "content": "Define a specific hazard for every hazard class based on the system and person. Here is the given system: {'name': 'Cargo Drone', 'description': 'Carries cargo up to 5kg with a speed of 3m/s'}, the person: 'Mechanic', and the hazard classes: 1. Electric 2. Mechanical"
+    }
+
+    few_shot_assistant = {
+        "role": "assistant",
+        "content": """[
+            {"idx": 1, "guide_phrase": "How could the cargo drone potentially cause harm to the Mechanic through Electricity?", "hazard_class": "Electric", "person": "Mechanic", "harm": "Mechanic gets electric shock."},
+            {"idx": 2, "guide_phrase": "How could the cargo drone potentially cause harm to the Mechanic through Mechanical means?", "hazard_class": "Mechanical", "person": "Mechanic", "harm": "Mechanic gets cut by rotating propellers."}
+        ]"""
+    }
+
+    numbered = " ".join(f"{i}. {hazard_class}" for i, hazard_class in enumerate(hazard_classes, start=1))
+    response = run_chat_hara(
+        messages=[
+            system_prompt,
+            few_shot_user,
+            few_shot_assistant,
+            {
+                "role": "user",
+                "content": f"Define a specific hazard for every hazard class based on the system and person. Here is the given system: {system}, the person: {person}, and the hazard classes: {numbered}"
+            }],
+        model=model,
+        expected_format="json",
+        temperature=0.8)
+
+    return index_batch(response, hazard_classes, valid_harm)
+
+
 def define_harms_thread(system, p, h, model):
     return define_harm(system, p, h, model)
 
-def harms(system: json, persons: List[Dict[str, str]], hazards: List[str], model: str = "google:gemini-1.5-pro"):
+
+# One request per person (in chunks of HARM_BATCH_SIZE hazard classes), single requests only for invalid cells.
+# hazards maps each person's name to the hazard classes to define for them.
+def harms_batched(system: json, persons: List[Dict[str, str]], hazards: Dict[str, List[str]],
+                  model: str = "google:gemini-1.5-pro", batch_size: int = HARM_BATCH_SIZE):
+    chunks = {p["name"]: chunked(hazards[p["name"]], batch_size) for p in persons}
+    # Keyed by (person, chunk index), so a dropped chunk can never shift the results of the others
+    with ThreadPoolExecutor(max_workers=max_concurrency()) as executor:
+        collector = {(p["name"], c): [executor.submit(define_harms_batch, system, p, chunk, model)]
+                     for p in persons for c, chunk in enumerate(chunks[p["name"]])}
+        batches = completed(collect_futures(executor, collector))
+
+    harms = {}
+    missing = {}
+    for p in persons:
+        cells = {}
+        for c, chunk in enumerate(chunks[p["name"]]):
+            for batch in batches.get((p["name"], c), []):
+                for i, entry in batch.items():
+                    cells[chunk[i]] = entry
+        harms[p["name"]] = cells
+        missing[p["name"]] = [h for h in hazards[p["name"]] if h not in cells]
+
+    budget = current_budget()
+    if any(missing.values()) and not (budget is not None and budget.hard_exceeded):
+        print(f"--- Defining {sum(len(m) for m in missing.values())} missing harms one by one")
+        persons_by_name = {p["name"]: p for p in persons}
+        with ThreadPoolExecutor(max_workers=max_concurrency()) as executor:
+            collector = {(name, h): [executor.submit(define_harms_thread, system, persons_by_name[name], h, model)]
+                         for name, hazard_list in missing.items() for h in hazard_list}
+            singles = completed(collect_futures(executor, collector))
+        for (name, h), results in singles.items():
+            for entry in results:
+                harms[name][h] = entry
+
+    return {name: [cells[h] for h in hazards[name] if h in cells] for name, cells in harms.items()}
+
+
+# batched=None switches to the batched mode once the run budget's soft limit is reached.
+# prune=True skips the person x hazard cells the plausibility filter rejects and reports them; pass a list as
+# pruned_cells to get the pruned cells with their scores for the HARA output.
+def harms(system: json, persons: List[Dict[str, str]], hazards: List[str], model: str = "google:gemini-1.5-pro",
+          batched: bool = None, prune: bool = False, pruned_cells: List[Dict[str, Any]] = None):
+    if prune:
+        pairs, pruned = plausible_pairs(system, persons, hazards)
+        report_pruned(pruned, len(persons) * len(hazards))
+        if pruned_cells is not None:
+            pruned_cells.extend(pruned)
+    else:
+        pairs = {p["name"]: hazards for p in persons}
+    if batched is None:
+        budget = current_budget()
+        batched = budget is not None and budget.soft_exceeded
+    if batched:
+        return harms_batched(system, persons, pairs, model)
     harms = {}
-    with ThreadPoolExecutor() as executor:
+    with ThreadPoolExecutor(max_workers=max_concurrency()) as executor:
         collector = {}
         for p in persons:
             collector[p["name"]] = []
-            for h in hazards:
+            for h in pairs[p["name"]]:
                 harm_future = executor.submit(define_harms_thread, system, p, h, model=model)
                 collector[p["name"]].append(harm_future)
-        for pname, future_list in collector.items():
-            harms_caused = []
-            for future in future_list:
-                harms_caused.append(future.result())
-            harms[pname] = harms_caused
+        harms = completed(collect_futures(executor, collector))
     return harms
 
 
@@ -551,20 +653,130 @@ def define_impact(system: json, impact_class: str, harms: str, model: str = "goo
 
     return response
 
+IMPACT_BATCH_SIZE = 15
+
+
+# A single physical value may come as a plain string, define_impacts_batch turns it into a list
+def valid_impact(entry: Dict[str, Any]) -> bool:
+    physical_value = entry.get("physical_value")
+    if isinstance(physical_value, str):
+        return bool(physical_value.strip())
+    return isinstance(physical_value, list) and any(isinstance(v, str) and v.strip() for v in physical_value)
+
+
+# Define the impacts of one impact class for a list of harms in a single request
+def define_impacts_batch(system: json, impact_class: str, harms: List[str], model: str = "google:gemini-1.5-pro"):
+    system_prompt = {
+        "role": "system",
+        "content": f"""
+        You are an expert in Hazard Analysis and Risk Assessment (HARA). 
+
+        TASK: 
+        Based on the provided system description, given impact class, and a numbered list of harms, answer the following guide phrase for EVERY harm: By influencing which physical value through <<impact class>> could the <<system>> cause <<harm>>?
+        The harms given are defined for a specific person with a role, like an engineer or a mechanic. I want you to generalise each harm so that it is not linked to a specific person, but rather just the harm itself. 
+        For example, instead of "Safety Officer gets struck by the vehicle" you would change it to "Vehicle strikes a person".
+        The physical value must make sense with the impact class and the harm caused.
+
+
+        OUTPUT FORMAT:
+        Return only a valid JSON array with one element per harm, where each element has exactly these keys:
+        - "idx": (integer, the number of the harm in the given list)
+        - "impact_class": (string, the provided impact class)
+        - "physical_value": (array of strings, the physical values that could be influenced through the impact class)
+        - "harm_caused": (string, generalised harm that could result)
+        """}
+
+    few_shot_user = {
+        "role": "user",
+        "content": "Define the impacts based on the system, impact class, and harms. Here is the given system: {'name': 'Cargo Drone', 'description': 'Carries cargo up to 5kg with a speed of 3m/s'}, the impact class: 'Rotating parts', and the harms: 1. Mechanic hit by drone. 2. Bystander cut by propeller."
+    }
+
+    few_shot_assistant = {
+        "role": "assistant",
+        "content": """[
+            {"idx": 1, "impact_class": "Rotating parts", "physical_value": ["The drone's propelles are rotating (RPM)"], "harm_caused": "Drone hits a person"},
+            {"idx": 2, "impact_class": "Rotating parts", "physical_value": ["The drone's propelles are rotating (RPM)"], "harm_caused": "Propeller cuts a person"}
+        ]"""
+    }
+
+    numbered = " ".join(f"{i}. {harm}" for i, harm in enumerate(harms, start=1))
+    response = run_chat_hara(
+        messages=[
+            system_prompt,
+            few_shot_user,
+            few_shot_assistant,
+            {
+                "role": "user",
+                "content": f"Define the impacts based on the system, impact class, and harms. Here is the given system: {system}, the impact class: {impact_class}, and the harms: {numbered}"
+            }],
+        model=model,
+        expected_format="json",
+        temperature=0.8)
+
+    impacts = index_batch(response, harms, valid_impact)
+    for entry in impacts.values():
+        if isinstance(entry.get("physical_value"), str):
+            entry["physical_value"] = [entry["physical_value"]]
+    return impacts
+
+
 def define_impact_thread(system, ic, harm, model):
     return define_impact(system, ic, harm, model)
 
-def impacts(system: json, impact_classes: List[str], harms_summary, model: str = "google:gemini-1.5-pro"):
+
+# One request per impact class (in chunks of IMPACT_BATCH_SIZE harms), single requests only for invalid items
+def impacts_batched(system: json, impact_classes: List[str], harms_summary: List[str],
+                    model: str = "google:gemini-1.5-pro", batch_size: int = IMPACT_BATCH_SIZE):
+    chunks = chunked(harms_summary, batch_size)
+    offsets = [sum(len(chunk) for chunk in chunks[:c]) for c in range(len(chunks))]
+    # Keyed by (impact class, chunk index), so a dropped chunk can never shift the results of the others
+    with ThreadPoolExecutor(max_workers=max_concurrency()) as executor:
+        collector = {(ic, c): [executor.submit(define_impacts_batch, system, ic, chunk, model)]
+                     for ic in impact_classes for c, chunk in enumerate(chunks)}
+        batches = completed(collect_futures(executor, collector))
+
     impacts = {}
-    with ThreadPoolExecutor() as executor:
+    missing = {}
+    for ic in impact_classes:
+        items = {}
+        for c in range(len(chunks)):
+            for batch in batches.get((ic, c), []):
+                for i, entry in batch.items():
+                    items[offsets[c] + i] = entry
+        impacts[ic] = items
+        missing[ic] = [i for i in range(len(harms_summary)) if i not in items]
+
+    budget = current_budget()
+    if any(missing.values()) and not (budget is not None and budget.hard_exceeded):
+        print(f"--- Defining {sum(len(m) for m in missing.values())} missing impacts one by one")
+        with ThreadPoolExecutor(max_workers=max_concurrency()) as executor:
+            collector = {(ic, i): [executor.submit(define_impact_thread, system, ic, harms_summary[i], model)]
+                         for ic, indices in missing.items() for i in indices}
+            singles = completed(collect_futures(executor, collector))
+        for (ic, i), results in singles.items():
+            for entry in results:
+                impacts[ic][i] = entry
+
+    return {ic: [items[i] for i in sorted(items)] for ic, items in impacts.items()}
+
+
+# batched=None switches to the batched mode once the run budget's soft limit is reached
+def impacts(system: json, impact_classes: List[str], harms_summary, model: str = "google:gemini-1.5-pro",
+            batched: bool = None):
+    if batched is None:
+        budget = current_budget()
+        batched = budget is not None and budget.soft_exceeded
+    if batched:
+        return impacts_batched(system, impact_classes, harms_summary, model)
+    impacts = {}
+    with ThreadPoolExecutor(max_workers=max_concurrency()) as executor:
         collector = {}
         for ic in impact_classes:
             collector[ic] = []
             for harm in harms_summary:
                 impact_future = executor.submit(define_impact_thread, system, ic, harm, model)
                 collector[ic].append(impact_future)
-        for ic, impact_futures in collector.items():
-            impacts[ic] = [impact_future.result() for impact_future in impact_futures]
+        impacts = completed(collect_futures(executor, collector))
     return impacts
 
 
@@ -674,6 +886,113 @@ def define_actuators(system: json, impact_classes: List[str], model: str = "goog
     return response
 
 
+HAZARD_CLASSES = ["Mechanical", "Kinetic", "Electrical", "Thermal", "Chemical", "Radiation", "Ergonomics",
+                  "Software/Control System", "Noise/Vibration"]
+
+
+def valid_persons(persons: Any) -> bool:
+    return isinstance(persons, list) and len(persons) > 0 and \
+        all(isinstance(p, dict) and isinstance(p.get("name"), str) and p["name"].strip() for p in persons)
+
+
+def valid_hazards(hazards: Any) -> bool:
+    return isinstance(hazards, list) and len(hazards) > 0 and all(h in HAZARD_CLASSES for h in hazards)
+
+
+def valid_iclasses(impact_classes: Any) -> bool:
+    return isinstance(impact_classes, list) and len(impact_classes) > 0 and \
+        all(isinstance(ic, str) and ic.strip() for ic in impact_classes)
+
+
+def valid_failure_modes(failure_modes: Any) -> bool:
+    return isinstance(failure_modes, list) and len(failure_modes) > 0 and \
+        all(isinstance(fm, dict) and isinstance(fm.get("failure_mode"), str) for fm in failure_modes)
+
+
+# Section key -> (validation, extraction function used as fallback)
+SETUP_SECTIONS = {
+    "persons": (valid_persons, extract_persons),
+    "hazards": (valid_hazards, extract_hazards),
+    "impact_classes": (valid_iclasses, extract_iclasses),
+    "failure_modes": (valid_failure_modes, identify_failure_modes),
+}
+
+
+# Persons, hazard classes, impact classes and failure modes of a system from a single request.
+# Every section is validated on its own; invalid sections are extracted again by their own function.
+def extract_setup(system: json, model: str = "google:gemini-1.5-pro"):
+    system_prompt = {
+        "role": "system",
+        "content": f"""
+        You are an expert in Hazard Analysis and Risk Assessment (HARA) and functional safety engineering.
+
+        TASK:
+        Analyze the given system description and prepare the first steps of a HARA at once:
+        1. "persons": all relevant persons that could interact with the system.
+        2. "hazards": all relevant high-level hazard classes. Use ONLY the following categories: {HAZARD_CLASSES}.
+        3. "impact_classes": the impact classes (physical values) of the system, general operational aspects that could lead to harm, such as "Rotating parts" or "Moving parts". Do not yet consider persons or specific harms.
+        4. "failure_modes": the predefined generic failure modes based ONLY on temporal (timing) and value deviations of an action ("Provision Commission", "Provision Omission", "Timing Early", "Timing Late", "Value Too High", "Value Too Low", "Value Incorrect"). Do not create component specific failure modes.
+
+        OUTPUT FORMAT:
+        Return only a valid JSON object with exactly these keys:
+        - "persons": (array of objects with the keys "name" (string, extremely concise) and "role" (string, a concise summary of their interaction with the system))
+        - "hazards": (array of strings)
+        - "impact_classes": (array of strings)
+        - "failure_modes": (array of objects with the keys "failure_mode" (string) and "description" (string, brief, generic explanation))
+        """}
+
+    few_shot_user = {
+        "role": "user",
+        "content": "Prepare the HARA for the system: {'name': 'Cargo Drone', 'description': 'Carries cargo up to 5kg with a speed of 3m/s'}."
+    }
+
+    few_shot_assistant = {
+        "role": "assistant",
+        "content": """{
+            "persons": [
+                {"name": "Operator", "role": "Controls and monitors the cargo drone during its operations."},
+                {"name": "Maintenance Technician", "role": "Performs regular maintenance and repairs on the cargo drone."},
+                {"name": "Bystander", "role": "Individuals in the vicinity who may be affected by the drone's operations."}
+            ],
+            "hazards": ["Mechanical", "Electrical", "Kinetic", "Chemical"],
+            "impact_classes": ["Rotating parts", "Position", "Moving parts", "Moving actuators"],
+            "failure_modes": [
+                {"failure_mode": "Provision Commission", "description": "Something is actuated even though it must not at the point in time."},
+                {"failure_mode": "Provision Omission", "description": "Something is not actuated although it must be at the point in time."},
+                {"failure_mode": "Timing Early", "description": "Something is actuated earlier than intended."},
+                {"failure_mode": "Timing Late", "description": "Something is actuated later than intended."},
+                {"failure_mode": "Value Too High", "description": "Something is actuated to a higher value than intended."},
+                {"failure_mode": "Value Too Low", "description": "Something is actuated to a lower value than intended."},
+                {"failure_mode": "Value Incorrect", "description": "Something is actuated to an incorrect value."}
+            ]
+        }"""
+    }
+
+    response = run_chat_hara(
+        messages=[
+            system_prompt,
+            few_shot_user,
+            few_shot_assistant,
+            {
+                "role": "user",
+                "content": f"Prepare the HARA for the system: {system}."
+            }],
+        model=model,
+        expected_format="json",
+        temperature=0.8)
+
+    response = response if isinstance(response, dict) else {}
+    setup = {key: response.get(key) for key in SETUP_SECTIONS}
+    invalid = [key for key, (valid, _) in SETUP_SECTIONS.items() if not valid(setup[key])]
+    if invalid:
+        print(f"--- Extracting {', '.join(invalid)} separately")
+        with ThreadPoolExecutor(max_workers=max_concurrency()) as executor:
+            futures = {key: executor.submit(SETUP_SECTIONS[key][1], system, model=model) for key in invalid}
+            for key, future in futures.items():
+                setup[key] = future.result()
+    return setup
+
+
 def extract_failure(system: json, failure_mode: str, actuator: str, impact: str, model: str = "google:gemini-1.5-pro"):
     system_prompt = {
         "role": "system",
@@ -769,31 +1088,164 @@ def extract_failure(system: json, failure_mode: str, actuator: str, impact: str,
     return response
 
 
+FAILURE_BATCH_SIZE = 10
+
+
+def valid_failures(entry: Dict[str, Any]) -> bool:
+    failures = entry.get("failures")
+    return isinstance(failures, list) and any(isinstance(f, str) and f.strip() for f in failures)
+
+
+# Define the failures of one failure mode and actuator for a list of impacts in a single request
+def extract_failures_grouped(system: json, failure_mode: str, actuator: str, impacts: List[Any],
+                             model: str = "google:gemini-1.5-pro"):
+    system_prompt = {
+        "role": "system",
+        "content": """
+        You are an expert in Hazard Analysis and Risk Assessment (HARA).
+
+        TASK:
+        Analyze the situation given the description of a system, the specified failure mode, actuator and a numbered list of impacts.
+        For EVERY impact, infer the answer to the question:
+        "To which failure would a <<failure mode>> of actuator <<actuator>> lead, causing <<impact>>?"
+        List all plausible system failures that:
+        - share logical connection with the failure mode and the actuator.
+        - can directly or indirectly cause the impact.
+        Return the most relevant 5 failures per impact.
+
+        DEFINITIONS:
+        - Failure modes are a predefined set: ("Provision Commission", "Provision Ommision", "Value too low", "Value too high", "Value incorrect", "Timing early", "Timing late")
+        - Actuator is the active physical component (e.g. Arm Gripper).
+        - Impact is a hazardous/dangerous situation, or harm. (e.g. explosion, fire, electric arc).
+        - A failure is a system deviation in an actuator or system behavior.
+
+        RULES:
+        1. Failures MUST be a clear detailed system event (no abstraction or ambiguity).
+        2. The impact and MUST NOT be repeated in the failure.
+        2. A failure MUST NOT contain information about what the failure causes, because it is already contained in the impact.
+
+        OUTPUT FORMAT:
+        Return only a valid JSON array with one element per impact, where each element has exactly these keys:
+        - "idx": (integer, the number of the impact in the given list)
+        - "question": (string, the original wording of the question with the replaced variables)
+        - "failures": (array of strings, all identified failures)
+        """
+    }
+
+    few_shot_user = {
+        "role": "user",
+        "content": """Give me all failures connected to these situations: 
+        - system: {'name': 'Cargo Drone', 'description': 'Carries cargo up to 5kg with a speed of 3m/s'}
+        - failure mode:  {'failure_mode': 'Provision Commission', 'description': 'Something is actuated even though it must not at the point in time.'}
+        - actuator : {'actuator': 'Rotors'}. 
+        - impacts: 1. {'impact': 'drone moving unsafely'} 2. {'impact': 'Propeller cuts a person'}
+        """
+    }
+
+    few_shot_assistant = {
+        "role": "assistant",
+        "content": """[
+        {"idx": 1, "question": "To which failure would a Provision Comission of actuator Rotors lead, causing the drone moving unsafely?",
+         "failures": ["One or more rotors start to / are rotating even though they must not at that point in time", "One or more rotors change rotation speed too late"]},
+        {"idx": 2, "question": "To which failure would a Provision Comission of actuator Rotors lead, causing a propeller to cut a person?",
+         "failures": ["Rotors start rotating while a person handles the drone on the ground", "Rotors are not stopped after landing"]}
+        ]"""
+    }
+
+    numbered = " ".join(f"{i}. {impact}" for i, impact in enumerate(impacts, start=1))
+    response = run_chat_hara(
+        messages=[
+            system_prompt,
+            few_shot_user,
+            few_shot_assistant,
+            {
+                "role": "user",
+                "content": f"""Define a multitude of unique failures associated with:
+                - system: {system}
+                - failure mode: {failure_mode}
+                - actuator: {actuator}
+                - impacts: {numbered}
+            """}],
+        model=model,
+        expected_format="json",
+        temperature=0.8)
+
+    return index_batch(response, impacts, valid_failures)
+
+
+# Evaluate the failure cells in relevance order (see RELEVANCE.py). top_k limits the impacts per actuator and
+# max_cells the total number of requests; the run budget cancels the remaining tail.
+# grouped=True asks for all impacts of one (failure mode, actuator) pair at once and only retries missing impacts
+# one by one, so the request count drops from failure modes x actuators x impacts to failure modes x actuators.
+# With a store, every failure is also added to its failure matrix, joined to failure mode, actuator and impact by ID.
 def collect_failures(system: json, failure_modes: List[Dict[str, str]], actuators: List[Dict[str, List[str]]],
-                     impacts: List[str], model: str = "google:gemini-1.5-pro"):
-    failures = {}
-    for failure_mode in failure_modes:
-        for actuator in actuators:
-            failures_list = []
-            for a in actuator["actuators"]:
-                for impact in impacts:
-                    failure = extract_failure(system, failure_mode, a, impact, model)
-                    failures_list.append(failure)
-                if a not in failures.keys():
-                    failures[a] = failures_list
-                else:
-                    failures[a].extend(failures_list)
+                     impacts: Any, model: str = "google:gemini-1.5-pro", top_k: int = None, max_cells: int = None,
+                     grouped: bool = False, store: HaraStore = None):
+    cells = rank_cells(failure_modes, actuators, impacts, top_k=top_k, max_cells=max_cells)
+    results = {}
+    if grouped:
+        # Groups in the order of their best cell, impacts in relevance order within a group
+        groups = {}
+        for i, cell in enumerate(cells):
+            key = (json.dumps(cell["failure_mode"], sort_keys=True, default=str), cell["actuator"])
+            groups.setdefault(key, []).append(i)
+        batches = [chunk for indices in groups.values() for chunk in chunked(indices, FAILURE_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=max_concurrency()) as executor:
+            collector = {b: [executor.submit(extract_failures_grouped, system, cells[chunk[0]]["failure_mode"],
+                                             cells[chunk[0]]["actuator"], [cells[i]["impact"] for i in chunk],
+                                             model)] for b, chunk in enumerate(batches)}
+            grouped_results = completed(collect_futures(executor, collector))
+        for b, chunk in enumerate(batches):
+            for batch in grouped_results.get(b, []):
+                for position, entry in batch.items():
+                    results[chunk[position]] = [entry]
+
+    budget = current_budget()
+    pending = [i for i in range(len(cells)) if i not in results]
+    if pending and not (grouped and budget is not None and budget.hard_exceeded):
+        if grouped:
+            print(f"--- Extracting {len(pending)} missing failures one by one")
+        with ThreadPoolExecutor(max_workers=max_concurrency()) as executor:
+            # Submitted best first, the executor's queue keeps that order
+            collector = {i: [executor.submit(extract_failure, system, cells[i]["failure_mode"], cells[i]["actuator"],
+                                             cells[i]["impact"], model)] for i in pending}
+            results.update(completed(collect_futures(executor, collector)))
+
+    if store is not None:
+        for mode in failure_modes:
+            store.add_failure_mode(mode.get("failure_mode", ""), mode.get("description", ""))
+        for entry in actuators or ():
+            for actuator in entry.get("actuators", []):
+                store.add_actuator(actuator, entry.get("impact_class", ""))
 
+    failures = {}
+    done = 0
+    for i, cell in enumerate(cells):
+        for failure in results.get(i, []):
+            failures.setdefault(cell["actuator"], []).append(failure)
+            done += 1
+            if store is not None and isinstance(failure, dict):
+                impact = cell["impact"]
+                harm_caused = impact.get("harm_caused", "") if isinstance(impact, dict) else str(impact)
+                for text in failure.get("failures", []):
+                    store.add_failure(cell["failure_mode"].get("failure_mode", ""), cell["actuator"],
+                                      cell["impact_class"] or "", harm_caused, str(text))
+    if done < len(cells):
+        print(f"Warning: Run budget exhausted after {done} of {len(cells)} failure cells.")
     return failures
 
 
-from rich.console import Console
-from rich.table import Table
-from rich.panel import Panel
-from typing import List, Dict, Any
+# rich is only needed for the display functions and is imported on first use, importing HARA stays fast
+def _rich():
+    from rich.console import Console
+    from rich.table import Table
+    from rich.panel import Panel
+    return Console, Table, Panel
 
 
 def display_system(system: Dict[str, str]):
+    Console, Table, Panel = _rich()
+    console = Console()
     console.rule("[bold #6495ED]==== STEP 1: SYSTEM DEFINITION (extract_system) ====")
     try:
         system_panel = Panel(
@@ -807,6 +1259,7 @@ def display_system(system: Dict[str, str]):
         console.print("[bold red]ERROR: Could not process System data. Check input format.[/bold red]")
 
 def display_persons(persons: List[Dict[str, str]]):
+    Console, Table, Panel = _rich()
     console = Console()
     console.rule("[bold #6495ED]==== STEP 2: PERSONS AT RISK (extract_persons) ====")
     try:
@@ -827,6 +1280,7 @@ def display_persons(persons: List[Dict[str, str]]):
         console.print("[bold red]ERROR: Could not process Persons data. Check input format.[/bold red]")
 
 def display_hazards(hazards: List[str]):
+    Console, Table, Panel = _rich()
     console = Console()
     console.rule("[bold #6495ED]==== STEP 3: HIGH-LEVEL HAZARD CLASSES (extract_hazards) ====")
     try:
@@ -843,6 +1297,7 @@ def display_hazards(hazards: List[str]):
         console.print("[bold red]ERROR: Could not process Hazard Classes data. Check input format.[/bold red]")
 
 def display_harms(harms_summary_list: List[str]):
+    Console, Table, Panel = _rich()
     console = Console()
     console.rule("[bold #6495ED]==== STEP 4: CONSOLIDATED UNIQUE HARMS (harms_summary) ====")
     if harms_summary_list:
@@ -858,6 +1313,7 @@ def display_harms(harms_summary_list: List[str]):
         console.print("No unique harms identified.")
 
 def display_impacts(impacts_dict: Dict[str, List[Dict[str, Any]]]):
+    Console, Table, Panel = _rich()
     console = Console()
     console.rule("[bold #6495ED]==== STEP 5: IMPACT MATRIX (extract_iclasses / define_impact) ====")
     impact_table = Table(
@@ -892,6 +1348,7 @@ def display_impacts(impacts_dict: Dict[str, List[Dict[str, Any]]]):
     console.print(impact_table)
 
 def display_failure_modes(failure_modes: List[Dict[str, str]]):
+    Console, Table, Panel = _rich()
     console = Console()
     console.rule("[bold #6495ED]==== STEP 6: IDENTIFIED FAILURE MODES ====")
     try:
@@ -910,6 +1367,7 @@ def display_failure_modes(failure_modes: List[Dict[str, str]]):
         console.print("[bold red]ERROR: Could not process failure modes data. Check input format.[/bold red]")
 
 def display_actuators(actuators: List[Dict[str, Any]]):
+    Console, Table, Panel = _rich()
     console = Console()
     console.rule("[bold #6495ED]==== STEP 7: ASSIGNED ACTUATORS ====")
     try:
@@ -942,6 +1400,7 @@ def display_hara_summary(
     Formats and prints the results of the HARA pipeline steps using the 'rich' library
     for clear, segmented, and professional output.
     """
+    Console, Table, Panel = _rich()
     console = Console()
 
     # --- 1. System Definition (STEP 1) ---
@@ -1089,8 +1548,12 @@ if __name__ == "__main__":
     impacts_dict = impacts(system, impact_classes, harms_summary_list, model="openai:gpt-5.2")
     failure_modes = identify_failure_modes(system, model="openai:gpt-5.2")
     actuators = define_actuators(system, impact_classes, model="openai:gpt-5.2")
-    # function extract_failure and collect_failures
-    # failures = collect_failures(system, failure_modes, actuators, impacts_dict, model="openai:gpt-5.2")
-    failures = {}
+    # The store keeps the records and the failure matrix joined by ID, top_k bounds the failure requests
+    store = HaraStore.from_pipeline(system, persons, hazards, harms_dict, harms_summary_list, impacts_dict,
+                                    failure_modes, actuators)
+    failures = collect_failures(system, failure_modes, actuators, impacts_dict, model="openai:gpt-5.2", top_k=3,
+                                grouped=True, store=store)
+    print(f"Failure matrix: {len(store.failures)} failures of {len(store.actuators)} actuators, "
+          f"{len(store.dumps())} bytes serialised")
     display_hara_summary(system, persons, hazards, harms_summary_list, impacts_dict, failure_modes, actuators, failures)
 
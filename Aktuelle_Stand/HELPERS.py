@@ -1,45 +1,186 @@
-import aisuite as ai
+import hashlib
 import json
+import os
 import re
-from dotenv import load_dotenv
+import threading
+from concurrent.futures import Future
+from types import SimpleNamespace
 from typing import Any
-import ast
+from JSON_REPAIR import parse_json, parse_json_or, JSONRepairError
+from BUDGET import RunBudget, BudgetExceeded, current_budget, run_budget, collect_futures, completed
+
+# Base URLs of the providers whose SDKs accept a shared httpx client, used for pooling and pre-warming
+PROVIDER_BASE_URLS = {
+    "openai": "https://api.openai.com/v1",
+    "anthropic": "https://api.anthropic.com",
+}
+PROVIDER_API_KEYS = {
+    "openai": "OPENAI_API_KEY",
+    "anthropic": "ANTHROPIC_API_KEY",
+}
+DEFAULT_MAX_CONCURRENCY = 16
+
+_env_loaded = False
+_client = None
+_http_client = None
+_client_lock = threading.Lock()
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _load_env():
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        _ = load_dotenv()
+        _env_loaded = True
+
+
+# Number of parallel LLM requests the fan-out steps use, configurable via HARA_MAX_CONCURRENCY
+def max_concurrency() -> int:
+    _load_env()
+    try:
+        return max(1, int(os.getenv("HARA_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)))
+    except ValueError:
+        return DEFAULT_MAX_CONCURRENCY
 
-_ = load_dotenv()
-client = ai.Client()
 
+# Providers with an API key in the environment
+def configured_providers() -> list:
+    _load_env()
+    return [provider for provider, key in PROVIDER_API_KEYS.items() if os.getenv(key)]
 
-def run_chat(messages: list, model: str, expected_format="text"):
-    try:
-        response = client.chat.completions.create(model=model, messages=messages)
-        content = response.choices[0].message.content
 
-        if expected_format == "json":
-            clean_content = content.replace("json", "").replace("", "").strip()
+def _build_http_client():
+    import httpx
+    size = max_concurrency()
+    limits = httpx.Limits(max_connections=size, max_keepalive_connections=size, keepalive_expiry=120)
+    return httpx.Client(limits=limits, timeout=httpx.Timeout(600.0, connect=10.0))
 
-            try:
-                return json.loads(clean_content)
-            except json.JSONDecodeError:
-                pass
 
+# Route the synchronous SDK client of every configured provider through the shared connection pool
+def _pool_providers(client):
+    global _http_client
+    try:
+        from aisuite.provider import ProviderFactory
+        _http_client = _build_http_client()
+    except ImportError:
+        return
+    for provider in configured_providers():
+        try:
+            instance = ProviderFactory.create_provider(provider, {})
+            sdk_client = getattr(instance, "client", None)
+            if sdk_client is not None and hasattr(sdk_client, "with_options"):
+                instance.client = sdk_client.with_options(http_client=_http_client)
+            client.providers[provider] = instance
+        except Exception as e:
+            print(f"Warning: Could not pool connections for {provider}: {e}")
+
+
+def _build_client():
+    _load_env()
+    import aisuite as ai
+    client = ai.Client()
+    _pool_providers(client)
+    return client
+
+
+# The single aisuite client shared by all modules, constructed on first use
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
+
+
+# Open TLS connections to the configured providers in the background, e.g. while the user is still typing
+def prewarm_connections(providers: list = None) -> threading.Thread:
+    def warm():
+        get_client()
+        if _http_client is None:
+            return
+        for provider in providers or configured_providers():
+            base_url = PROVIDER_BASE_URLS.get(provider)
+            if base_url is None:
+                continue
             try:
-                return ast.literal_eval(clean_content)
-            except (ValueError, SyntaxError):
+                _http_client.head(base_url)
+            except Exception:
                 pass
 
-            match = re.search(r'([.]|{.})', clean_content, re.DOTALL)
-            if match:
-                try:
-                    candidate = match.group(1)
+    thread = threading.Thread(target=warm, daemon=True)
+    thread.start()
+    return thread
+
+
+# Offline backend for "mock:<name>" models. It answers with the last few-shot assistant message of the prompt (or an
+# empty JSON object) and reports a token usage estimated from the message lengths.
+def mock_completion(messages: list, model: str):
+    answers = [m["content"] for m in messages if m.get("role") == "assistant"]
+    content = answers[-1] if answers else "{}"
+    usage = SimpleNamespace(prompt_tokens=len(json.dumps(messages)) // 4, completion_tokens=len(content) // 4)
+    message = SimpleNamespace(role="assistant", content=content)
+    return SimpleNamespace(model=model, choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def _request_key(messages: list, model: str, params: dict) -> str:
+    return json.dumps([model, messages, params], sort_keys=True, default=str)
+
+
+# Send one chat completion and return its content. Identical requests (same model, messages and params) that are
+# already in flight are not sent again, later callers wait for the first caller's response instead.
+def complete_chat(messages: list, model: str, **params) -> str:
+    budget = current_budget()
+    if budget is not None:
+        budget.check()
+        model = budget.select_model(model)
+    key = _request_key(messages, model, params)
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+    if not leader:
+        return future.result()
+
+    try:
+        if model.startswith("mock:"):
+            response = mock_completion(messages, model)
+        else:
+            response = get_client().chat.completions.create(model=model, messages=messages)
+        if budget is not None:
+            budget.record_usage(model, getattr(response, "usage", None))
+        future.set_result(response.choices[0].message.content)
+    except BaseException as e:
+        future.set_exception(e)
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+    return future.result()
+
+
+# Default value returned when a JSON response could not be parsed at all
+def _empty_json(messages: list) -> Any:
+    return [] if "list" in str(messages).lower() else {}
+
 
-                    return json.loads(candidate.replace("'", '"'))
-                except:
-                    pass
+def run_chat(messages: list, model: str, expected_format="text"):
+    try:
+        content = complete_chat(messages, model)
 
-            print(f"Warning: Parsing failed completely for {model}. Raw: {clean_content}...")
-            return [] if "list" in str(messages) else {}
+        if expected_format == "json":
+            try:
+                return parse_json(content)
+            except JSONRepairError:
+                print(f"Warning: Parsing failed completely for {model}. Raw: {content}...")
+                return _empty_json(messages)
 
         return content
+    except BudgetExceeded:
+        raise
     except Exception as e:
         print(f"Error calling model {model}: {e}")
         return {} if expected_format == "json" else ""
@@ -47,33 +188,55 @@ def run_chat(messages: list, model: str, expected_format="text"):
 
 def run_chat_hara(messages: list, model: str, expected_format: str = "text", **kwargs) -> Any:
     try:
-        response = client.chat.completions.create(model=model, messages=messages)
-        content = response.choices[0].message.content
+        content = complete_chat(messages, model, **kwargs)
 
         if expected_format == "json":
-            match = re.search(r"```(?:json)?\s*(.*?)\s*```", content, re.DOTALL)
-
-            if match:
-                clean_content = match.group(1).strip()
-            else:
-                json_start = re.search(r"[\[\{]", content)
-                if json_start:
-                    clean_content = content[json_start.start():].strip()
-                else:
-                    clean_content = content.strip()
-
             try:
-                return json.loads(clean_content)
-            except json.JSONDecodeError:
-                try:
-                    fixed_content = clean_content.replace("'", '"')
-                    return json.loads(fixed_content)
-                except json.JSONDecodeError:
-                    print(f"Warning: Parsing failed completely for {model}.")
-                    print(f"Raw Content: {clean_content[:100]}...")
-                    return [] if "list" in str(messages).lower() else {}
+                return parse_json(content)
+            except JSONRepairError:
+                print(f"Warning: Parsing failed completely for {model}.")
+                print(f"Raw Content: {content[:100]}...")
+                return _empty_json(messages)
         return content
 
+    except BudgetExceeded:
+        raise
     except Exception as e:
         print(f"Error calling model {model}: {e}")
         return [] if expected_format == "json" else ""
+
+
+# Stable hash of a system description, keys per-system caches
+def system_fingerprint(system_description) -> str:
+    return hashlib.sha1(json.dumps(system_description, sort_keys=True, default=str).encode()).hexdigest()
+
+
+# Split items into chunks of at most size entries
+def chunked(items: list, size: int) -> list:
+    items = list(items)
+    size = max(1, size)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+# Map an indexed array answer ([{"idx": 1, ...}, ...]) back to the positions of the batch items.
+# Entries with an unknown index or that fail valid() are left out, so the caller can fall back to single requests.
+# A single indexed object counts as a one entry array, other objects are unwrapped to their first list of objects.
+def index_batch(response: Any, items: list, valid=lambda entry: True) -> dict:
+    if isinstance(response, dict):
+        if "idx" in response:
+            response = [response]
+        else:
+            response = next((value for value in response.values()
+                             if isinstance(value, list) and value and all(isinstance(v, dict) for v in value)),
+                            [response])
+    results = {}
+    for entry in response if isinstance(response, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        idx = entry.get("idx")
+        if isinstance(idx, str) and idx.strip().isdigit():
+            idx = int(idx)
+        if isinstance(idx, int) and 1 <= idx <= len(items) and idx - 1 not in results and valid(entry):
+            # Same shape as the answer of a single request
+            results[idx - 1] = {key: value for key, value in entry.items() if key != "idx"}
+    return results
@@ -0,0 +1,157 @@
+from typing import Any, Dict, List, Optional
+from JSON_PATCH import apply_patch, to_pointer
+
+# Version history for the interactive edits of a HARA step.
+# Versions are plain JSON documents that are treated as immutable: JSON_PATCH copies only the containers on the
+# path to a change, and commit() re-links regenerated documents to the sub-trees of the previous version they
+# equal. Consecutive versions therefore share everything that did not change, a snapshot costs O(change) memory,
+# and diff() can skip shared sub-trees by identity.
+
+
+# Return new with every sub-tree that equals the corresponding sub-tree of old replaced by the old object
+def share(old: Any, new: Any) -> Any:
+    if old is new:
+        return new
+    if isinstance(old, dict) and isinstance(new, dict):
+        shared = {key: share(old[key], value) if key in old else value for key, value in new.items()}
+        if len(shared) == len(old) and all(key in old and shared[key] is old[key] for key in shared):
+            return old
+        return shared
+    if isinstance(old, list) and isinstance(new, list):
+        # Align by position and, for shifted entries, by equality with any entry of the old list
+        by_value = None
+        shared = []
+        for i, item in enumerate(new):
+            if i < len(old) and old[i] is item:
+                shared.append(item)
+                continue
+            if by_value is None:
+                by_value = {}
+                for entry in old:
+                    by_value.setdefault(_fingerprint(entry), entry)
+            match = by_value.get(_fingerprint(item))
+            if match is not None:
+                shared.append(match)
+            elif i < len(old):
+                shared.append(share(old[i], item))
+            else:
+                shared.append(item)
+        if len(shared) == len(old) and all(a is b for a, b in zip(shared, old)):
+            return old
+        return shared
+    return old if type(old) is type(new) and old == new else new
+
+
+def _fingerprint(value: Any) -> Any:
+    if isinstance(value, dict):
+        return ("d",) + tuple(sorted((key, _fingerprint(item)) for key, item in value.items()))
+    if isinstance(value, list):
+        return ("l",) + tuple(_fingerprint(item) for item in value)
+    # True == 1 == 1.0 in Python, the type keeps them apart
+    return type(value), value
+
+
+# Type-aware equality, also inside containers ([[1.0]] and [[True]] differ)
+def _same(a: Any, b: Any) -> bool:
+    return a is b or (type(a) is type(b) and _fingerprint(a) == _fingerprint(b))
+
+
+# RFC 6902 operations that turn a into b, skipping sub-trees both versions share
+def diff(a: Any, b: Any, path: tuple = ()) -> List[Dict[str, Any]]:
+    if a is b:
+        return []
+    if isinstance(a, dict) and isinstance(b, dict):
+        operations = []
+        for key in a:
+            if key not in b:
+                operations.append({"op": "remove", "path": to_pointer(path + (key,))})
+        for key, value in b.items():
+            if key not in a:
+                operations.append({"op": "add", "path": to_pointer(path + (key,)), "value": value})
+            else:
+                operations.extend(diff(a[key], value, path + (key,)))
+        return operations
+    if isinstance(a, list) and isinstance(b, list):
+        start = 0
+        while start < min(len(a), len(b)) and _same(a[start], b[start]):
+            start += 1
+        end_a, end_b = len(a), len(b)
+        while end_a > start and end_b > start and _same(a[end_a - 1], b[end_b - 1]):
+            end_a -= 1
+            end_b -= 1
+        operations = []
+        common = min(end_a - start, end_b - start)
+        for offset in range(common):
+            operations.extend(diff(a[start + offset], b[start + offset], path + (start + offset,)))
+        for index in range(end_a - 1, start + common - 1, -1):
+            operations.append({"op": "remove", "path": to_pointer(path + (index,))})
+        for index in range(start + common, end_b):
+            operations.append({"op": "add", "path": to_pointer(path + (index,)), "value": b[index]})
+        return operations
+    if _same(a, b):
+        return []
+    return [{"op": "replace", "path": to_pointer(path), "value": b}]
+
+
+class History:
+    """Undo/redo stack of document versions with structural sharing between consecutive versions."""
+
+    def __init__(self, document: Any, max_versions: Optional[int] = None):
+        self.versions = [document]
+        self.position = 0
+        self.max_versions = max_versions
+
+    @property
+    def current(self) -> Any:
+        return self.versions[self.position]
+
+    def can_undo(self) -> bool:
+        return self.position > 0
+
+    def can_redo(self) -> bool:
+        return self.position < len(self.versions) - 1
+
+    # Add a new version after the current one; versions that were undone are dropped
+    def commit(self, document: Any) -> Any:
+        document = share(self.current, document)
+        if document is self.current:
+            return document
+        del self.versions[self.position + 1:]
+        self.versions.append(document)
+        if self.max_versions is not None and len(self.versions) > self.max_versions:
+            del self.versions[:len(self.versions) - self.max_versions]
+        self.position = len(self.versions) - 1
+        return document
+
+    def apply(self, patch: List[Dict[str, Any]]) -> Any:
+        return self.commit(apply_patch(self.current, patch))
+
+    def undo(self) -> Any:
+        if self.can_undo():
+            self.position -= 1
+        return self.current
+
+    def redo(self) -> Any:
+        if self.can_redo():
+            self.position += 1
+        return self.current
+
+    # Operations from version a to version b, by default from the previous to the current version
+    def diff(self, a: Optional[int] = None, b: Optional[int] = None) -> List[Dict[str, Any]]:
+        b = self.position if b is None else b
+        a = max(b - 1, 0) if a is None else a
+        return diff(self.versions[a], self.versions[b])
+
+
+if __name__ == "__main__":
+    # Sharing must never change a value: equal but differently typed scalars stay as committed
+    history = History({"flag": True, "values": [True, 1.0, {"n": 1}]})
+    for document in ({"flag": 1}, {"values": [True, 1, {"n": True}]}, {"values": [1, 1, 1.0, True]}):
+        committed = history.commit(document)
+        assert committed == document and repr(committed) == repr(document), (document, committed)
+    replaced = [op for op in history.diff(0, 1) if op["op"] == "replace"]
+    assert len(replaced) == 1 and type(replaced[0]["value"]) is int, replaced
+    # Nested containers are compared by type as well
+    assert diff([[1.0]], [[True]]) == [{"op": "replace", "path": "/0/0", "value": True}]
+    assert diff({"a": [{"n": 1}]}, {"a": [{"n": 1.0}]}) == [{"op": "replace", "path": "/a/0/n", "value": 1.0}]
+    print("History checks passed.")
@@ -1,14 +1,11 @@
 import itertools
-from typing import List, Dict
-import aisuite as ai
-from dotenv import load_dotenv
+from functools import lru_cache
+from types import MappingProxyType
+from typing import List, Dict, Mapping, Optional, Tuple
 import json
 import re
 from HELPERS import *
 
-_ = load_dotenv()
-client = ai.Client()
-
 risk_parameters = """
 C = "Severity / Consequence [C1: no injury, C2: minor injury, C3: major injury, C4: fatal injury]"
 F = "frequency of exposure [F1: rare exposure, F2: medium exposure, F3: regular exposure]"
@@ -25,8 +22,6 @@ Injury_Data_Info =
 """
 Injury_Data = ["", 600_000, 31_000, 500, 10]
 
-risk_graph = {}
-
 
 # Cleans JSON data
 def normalize_hazard_data(raw_input):
@@ -81,10 +76,10 @@ def normalize_hazard_data(raw_input):
 
 # Helper to create chat prompt message dictionaries
 def extract_json_array(text):
-    # Find first JSON array; allows for multiline spanning brackets
-    match = re.search(r"(\[[\s\S]*?\])", text)
-    if match:
-        return match.group(1)
+    # Find first JSON array, tolerating fences, prose and truncated output
+    array = parse_json_or(text)
+    if isinstance(array, list):
+        return json.dumps(array)
     return None
 
 
@@ -124,10 +119,18 @@ def get_injury_stats(system_description: str, model: str = "openai:gpt-4o") -> L
     return injury_Data
 
 
-# Calculating the Risk Graph with the PFHACC value using the Injury Data
+# Calculating the Risk Graph with the PFHACC value using the Injury Data.
+# The graph maps the CFPW number to (C exponent, F exponent, P exponent, SIL) and is immutable, so one graph can be
+# shared by any number of concurrent assessments. Graphs are cached per injury data.
+
+def calculate_risk_graph(injury_data: List = Injury_Data) -> Mapping[int, Tuple[int, int, int, int]]:
+    return _risk_graph(tuple(injury_data[1:5]))
+
 
-def calculate_risk_graph(injury_data: List = Injury_Data):
+@lru_cache(maxsize=256)
+def _risk_graph(injury_data: tuple) -> Mapping[int, Tuple[int, int, int, int]]:
     print("--- Calculating Risk Graph")
+    workers, minor, major, fatal = injury_data
     C = {'C2': 2, 'C3': 3, 'C4': 4}
     F = {'F1': 1, 'F2': 2, 'F3': 3}
     P = {'P1': 1, 'P2': 2}
@@ -139,14 +142,15 @@ def calculate_risk_graph(injury_data: List = Injury_Data):
         P.values(),
         W.values(),
     ))
-    PFH_minor = 1 / ((1 / (injury_data[2] / injury_data[1])) * 8760)
-    PFH_major = 1 / ((1 / (injury_data[3] / injury_data[1])) * 8760)
-    PFH_fatal = 1 / ((1 / (injury_data[4] / injury_data[1])) * 8760)
+    PFH_minor = 1 / ((1 / (minor / workers)) * 8760)
+    PFH_major = 1 / ((1 / (major / workers)) * 8760)
+    PFH_fatal = 1 / ((1 / (fatal / workers)) * 8760)
     PFH_minor = int(format(PFH_minor, ".1e").split("e")[1])
     PFH_major = int(format(PFH_major, ".1e").split("e")[1])
     # PFH_major = -7
     PFH_fatal = int(format(PFH_fatal, ".1e").split("e")[1])
     concatenated_numbers = [int(''.join(map(str, combo))) for combo in combinations]
+    risk_graph = {}
     for num in concatenated_numbers:
         risk_graph[num] = [0, 0, 0, 0]
         c = int(num / 1000)
@@ -186,14 +190,128 @@ def calculate_risk_graph(injury_data: List = Injury_Data):
             risk_graph[num][3] = 10
         else:
             risk_graph[num][3] = 0
+    return MappingProxyType({num: tuple(values) for num, values in risk_graph.items()})
+
+
+# Injury data as returned by get_injury_stats, or the default data if the statistics are incomplete
+def usable_injury_data(injury_data: Optional[List]) -> List:
+    try:
+        counts = [float(value) for value in injury_data[1:5]]
+    except (TypeError, ValueError, IndexError):
+        return Injury_Data
+    if len(counts) != 4 or counts[0] <= 0 or min(counts[1:]) <= 0:
+        return Injury_Data
+    return [injury_data[0]] + counts
+
+
+# Scenario sweeps: the risk graph of many injury data scenarios at once.
+# A scenario is (workers, minor, major, fatal injuries per year). The SIL table of a scenario, indexed by the C, F and P
+# level, is cached, so analysts can add scenarios interactively and only new ones are computed.
+
+SIL_LABELS = {0: '-', 10: 'P'}
+
+
+# Only the scenario sweeps need NumPy, it is imported on first use
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Scenario sweeps require NumPy: pip install numpy")
+    return numpy
+
+
+def _scenario_key(injury_data: List) -> tuple:
+    # Accepts the Injury_Data layout with the industry name in front
+    values = injury_data[1:] if len(injury_data) == 5 else injury_data
+    return tuple(float(v) for v in values)
+
+
+# Exponent of the PFH in the notation of calculate_risk_graph, for arrays of injury rates
+def pfh_exponents(rates):
+    np = _numpy()
+    pfh = np.asarray(rates, dtype=float) / 8760
+    exponent = np.zeros(pfh.shape, dtype=np.int64)
+    positive = pfh > 0
+    exponent[positive] = np.floor(np.log10(pfh[positive]))
+    # Mantissas that round to 10.0 with one decimal move up one exponent, like format(x, ".1e")
+    mantissa = np.where(positive, pfh / np.power(10.0, exponent), 0)
+    exponent += np.round(mantissa, 1) >= 10
+    return exponent
+
+
+# SIL tables (scenarios, C, F, P) in one vectorised pass
+def _compute_sil_tables(data):
+    np = _numpy()
+    # C2 -> minor, C3 -> major, C4 -> fatal injuries, relative to the number of workers
+    base = pfh_exponents(data[:, 1:4] / data[:, :1])
+    frequency = np.array([0, 2, 1, 0])  # F1 +2, F2 +1, F3 +0
+    avoidance = np.array([0, 1, 0])  # P1 +1, P2 +0
+    value = base[:, :, None, None] + frequency[None, None, :, None] + avoidance[None, None, None, :]
+    sil = np.select([value == -8, value == -7, value == -6, value == -5, value <= -9], [4, 3, 2, 1, 10], 0)
+    sil[:, :, 0, :] = 0
+    sil[:, :, :, 0] = 0
+    tables = np.zeros((len(data), 5, 4, 3), dtype=np.int64)
+    tables[:, 2:] = sil
+    return tables
+
+
+# The read-only SIL table of one scenario, bounded and thread-safe like _risk_graph
+@lru_cache(maxsize=1024)
+def _scenario_table(key: tuple):
+    table = _compute_sil_tables(_numpy().array([key]))[0]
+    table.flags.writeable = False
+    return table
+
+
+def scenario_sil_tables(scenarios: List[List]):
+    return _numpy().stack([_scenario_table(_scenario_key(scenario)) for scenario in scenarios])
+
+
+# Scenarios around the given injury data: every injury count scaled by every factor
+def scenarios_around(injury_data: List = Injury_Data, factors=(0.5, 1, 2)) -> List[List]:
+    workers, minor, major, fatal = _scenario_key(injury_data)
+    return [[workers, minor * a, major * b, fatal * c] for a, b, c in itertools.product(factors, repeat=3)]
+
+
+# SIL of every hazard (normalize_hazard_data format) in every scenario, and the hazards whose SIL differs from the
+# baseline scenario
+def sweep_scenarios(hazard_param_mat: List[dict], scenarios: List[List], baseline: List = Injury_Data) -> Dict:
+    np = _numpy()
+    tables = scenario_sil_tables([baseline] + list(scenarios))
+    levels = np.array([[int(str(hazard[key])[1:]) if str(hazard.get(key, "?"))[1:].isdigit() else 0 for key in "CFP"]
+                       for hazard in hazard_param_mat], dtype=np.int64).reshape(-1, 3)
+    for h, row in enumerate(levels):
+        for key, level, size in zip("CFP", row, tables.shape[1:]):
+            if level >= size:
+                raise ValueError(f"{key}{level} of hazard {hazard_param_mat[h].get('hazard')!r} is outside the risk "
+                                 f"graph ({key}0..{key}{size - 1})")
+    sil = tables[:, levels[:, 0], levels[:, 1], levels[:, 2]]  # (1 + scenarios, hazards)
+    labels = lambda value: SIL_LABELS.get(int(value), int(value))
+    shifts = []
+    for h, hazard in enumerate(hazard_param_mat):
+        changed = {k: labels(sil[k + 1, h]) for k in range(len(scenarios)) if sil[k + 1, h] != sil[0, h]}
+        if changed:
+            shifts.append({"hazard": hazard.get("hazard"), "baseline": labels(sil[0, h]), "scenarios": changed})
+    return {
+        "scenarios": [list(_scenario_key(scenario)) for scenario in scenarios],
+        "SIL": [[labels(value) for value in row] for row in sil[1:]],
+        "shifts": shifts,
+    }
 
 
 # Send an LLM Call to determine for every HAZARD what the appropriate risk parameters' values they should have.
-def risk_parameters_prompt(hazard_list: List[str], standard: str, model: str, parameters: str = risk_parameters) -> \
-        List[Dict]:
+# contexts optionally holds the harm, operational situation and avoidance context of every hazard (see
+# ISO26262.extract_factors), shared with the other standards in the multi-standard assessment.
+def risk_parameters_prompt(hazard_list: List[str], standard: str, model: str, parameters: str = risk_parameters,
+                           contexts: Optional[List[Dict[str, str]]] = None) -> List[Dict]:
     print("--- Assigning values to the Risk parameters of every Scenario")
     result = []
     for idx, hazard in enumerate(hazard_list, start=1):
+        context = ""
+        if contexts and contexts[idx - 1]:
+            factors = contexts[idx - 1]
+            context = (f"Harm: {factors.get('harm', '')}, operational situation: {factors.get('situation', '')}, "
+                       f"avoidance: {factors.get('context', '')}\n")
         messages = [
             {"role": "system", "content":
                 f"""You are an expert functional safety engineer familiar with the IEC 61508 standard and HARA analysis.
@@ -228,7 +346,7 @@ def risk_parameters_prompt(hazard_list: List[str], standard: str, model: str, pa
                 "reason" : "short explanation why this value is assigned"
             }}"""},
             {"role": "user", "content":
-                f"Hazard scenario: {hazard}\n"
+                f"Hazard scenario: {hazard}\n" + context
              }]
         response = run_chat(messages, model, expected_format="json")
         result.append(response)
@@ -237,37 +355,93 @@ def risk_parameters_prompt(hazard_list: List[str], standard: str, model: str, pa
 
 # Using the calculated Risk-parameters-values and the calculated Risk graph, the SIL-value of every HAZARD scenario is determined.
 
-def risk_assessment(hazard_param_mat: List[dict]) -> List[dict]:
+def risk_assessment(hazard_param_mat: List[dict], risk_graph: Mapping = None) -> List[dict]:
     print("--- Given the assigned risk parameters and the risk graph assign the SIL value for every hazard scenario")
-    for i, hazard in enumerate(hazard_param_mat):
+    risk_graph = risk_graph if risk_graph is not None else calculate_risk_graph()
+    result = []
+    for hazard in hazard_param_mat:
+        hazard = dict(hazard)
         paras = {key: hazard[key] for key in ['C', 'F', 'P'] if key in hazard}
         numbers = ''.join([value[1] for value in paras.values()])
         combined_number = int(numbers)
         combined_number = (combined_number * 10) + 1
         sil = risk_graph[combined_number][3]
         if sil == 10:
-            hazard_param_mat[i]["SIL"] = 'P'
+            hazard["SIL"] = 'P'
         elif sil == 0:
-            hazard_param_mat[i]["SIL"] = '-'
+            hazard["SIL"] = '-'
         else:
-            hazard_param_mat[i]["SIL"] = sil
-        hazard_param_mat[i]["W"] = "W3"
-    return hazard_param_mat
+            hazard["SIL"] = sil
+        hazard["W"] = "W3"
+        result.append(hazard)
+    return result
+
+
+class IECAssessment:
+    """IEC 61508 assessment of one system. All state lives in the instance, so assessments run concurrently."""
+
+    def __init__(self, injury_data: List = Injury_Data, standard: str = "IEC 61508", model: str = "openai:gpt-4o"):
+        self.injury_data = usable_injury_data(injury_data)
+        self.standard = standard
+        self.model = model
+        self.risk_graph = calculate_risk_graph(self.injury_data)
+
+    @classmethod
+    def for_system(cls, system_description: str, standard: str = "IEC 61508",
+                   model: str = "openai:gpt-4o") -> "IECAssessment":
+        return cls(get_injury_stats(system_description), standard, model)
+
+    def assess(self, hazard_param_mat: List[dict]) -> List[dict]:
+        return risk_assessment(hazard_param_mat, self.risk_graph)
+
+    def run(self, hazard_list: List[str], contexts: Optional[List[Dict[str, str]]] = None) -> List[dict]:
+        hazard_paras = risk_parameters_prompt(hazard_list=hazard_list, standard=self.standard, model=self.model,
+                                              contexts=contexts)
+        cleaned_paras = normalize_hazard_data(hazard_paras)
+        result = self.assess(cleaned_paras)
+        for i in hazard_paras:
+            for j in result:
+                if i["hazard"] == j["hazard"]:
+                    i["SIL"] = j["SIL"]
+                    i["W"] = j["W"]
+        return hazard_paras
 
 
 # The center running method
 
+# injury_data skips the statistics request, e.g. when they were prefetched (RISK_ASSESSMENT.injury_stats)
 def run_risk_assessment(hazard_list: List[str], system_description: str, standard: str = "IEC 61508",
-                        model: str = "openai:gpt-4o") -> List[dict]:
+                        model: str = "openai:gpt-4o", injury_data: Optional[List] = None) -> List[dict]:
     print("--- Started Risk Assessment")
-    inj_data = get_injury_stats(system_description)
-    calculate_risk_graph()
-    hazard_paras = risk_parameters_prompt(hazard_list=hazard_list, standard=standard, model=model)
-    cleaned_paras = normalize_hazard_data(hazard_paras)
-    result = risk_assessment(cleaned_paras)
-    for i in hazard_paras:
-        for j in result:
-            if i["hazard"] == j["hazard"]:
-                i["SIL"] = j["SIL"]
-                i["W"] = j["W"]
-    return hazard_paras
+    if injury_data is None:
+        return IECAssessment.for_system(system_description, standard, model).run(hazard_list)
+    return IECAssessment(injury_data, standard, model).run(hazard_list)
+
+
+# Assess many systems with different injury data in parallel threads and compare every result with a sequential run
+def stress_test(systems: int = 64, rounds: int = 20, workers: int = 16) -> bool:
+    import random
+    from concurrent.futures import ThreadPoolExecutor
+    rng = random.Random(0)
+    hazards = [{"idx": i, "hazard": f"Hazard {i}", "C": f"C{c}", "F": f"F{f}", "P": f"P{p}", "W": "W3"}
+               for i, (c, f, p) in enumerate(itertools.product((2, 3, 4), (1, 2, 3), (1, 2)))]
+    data = [["", rng.randint(10_000, 5_000_000), rng.randint(1, 100_000), rng.randint(1, 5_000), rng.randint(1, 200)]
+            for _ in range(systems)]
+    expected = [[h["SIL"] for h in IECAssessment(d).assess(hazards)] for d in data]
+
+    def assess(i):
+        engine = IECAssessment(data[i])
+        return i, [h["SIL"] for h in engine.assess(hazards)]
+
+    # The sequential phase filled the cache, the concurrent phase has to build the risk graphs itself
+    _risk_graph.cache_clear()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(assess, [i % systems for i in range(systems * rounds)]))
+    mismatches = sum(sils != expected[i] for i, sils in results)
+    print(f"{len(results)} concurrent assessments of {systems} systems, {_risk_graph.cache_info().misses} risk graphs "
+          f"built concurrently, {mismatches} mismatches")
+    return mismatches == 0
+
+
+if __name__ == "__main__":
+    stress_test()
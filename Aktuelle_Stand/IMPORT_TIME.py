@@ -0,0 +1,61 @@
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Cold start guard for batch workers and CLI invocations. Every entry module is imported in a fresh interpreter with
+# -X importtime; its cumulative import time must stay within the budget and none of the heavy optional dependencies
+# may be imported before they are used. Run: python IMPORT_TIME.py (exit code 1 if a budget is exceeded)
+
+# Cumulative import time budget per module in milliseconds
+IMPORT_BUDGET_MS = {
+    "HELPERS": 40,
+    "HARA": 60,
+    "FILE_SEARCH": 60,
+    "ISO26262": 50,
+    "IEC61508": 50,
+    "RISK_ASSESSMENT": 70,
+    "SENSITIVITY": 70,
+    "UI": 120,
+}
+# Loaded on first use only: console output, provider SDKs and clients, NumPy
+LAZY_MODULES = ["rich", "aisuite", "openai", "anthropic", "httpx", "dotenv", "numpy", "pip"]
+RUNS = 5
+
+_LINE = re.compile(r"^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)")
+
+
+# (cumulative microseconds of the module, names of all imported modules) of one cold import
+def import_profile(module: str) -> Tuple[int, List[str]]:
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{process.stderr[-2000:]}")
+    cumulative = 0
+    imported = []
+    for line in process.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            imported.append(match.group(4))
+            if match.group(4) == module:
+                cumulative = int(match.group(2))
+    return cumulative, imported
+
+
+def check(budgets: Dict[str, int] = IMPORT_BUDGET_MS, runs: int = RUNS) -> bool:
+    ok = True
+    for module, budget in budgets.items():
+        # The best of several runs, the first one also writes the bytecode cache
+        profiles = [import_profile(module) for _ in range(runs)]
+        best = min(cumulative for cumulative, _ in profiles) / 1000
+        eager = sorted({name.split(".")[0] for name in profiles[-1][1]} & set(LAZY_MODULES))
+        passed = best <= budget and not eager
+        ok = ok and passed
+        print(f"{'ok  ' if passed else 'FAIL'} {module:<16} {best:7.1f} ms (budget {budget} ms)"
+              + (f", eagerly imports {', '.join(eager)}" if eager else ""))
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check() else 1)
@@ -0,0 +1,151 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+from ROUTING import QUERY_HINTS, QUERY_TYPES
+
+# Local intent classification for the feedback loop. Keyword rules and a small multinomial Naive Bayes model
+# (fitted on the queries the LLM classified before) answer in milliseconds; query_detection_LLM only calls the
+# LLM when they are not confident. A keyword alone stays below the threshold, it only decides together with an
+# agreeing model.
+
+LOG_FILE = "query_log.jsonl"
+CONFIDENCE_THRESHOLD = 0.85
+# Confidence of a keyword rule on its own, deliberately below CONFIDENCE_THRESHOLD
+RULE_CONFIDENCE = 0.7
+MIN_TRAINING_QUERIES = 20
+
+# Words referring to earlier queries, which the local tier can not resolve
+CONTEXT_WORDS = re.compile(r"\b(it|that|this|those|them|same|again|previous|above)\b", re.IGNORECASE)
+# Negations turn the hinted keyword around ("don't remove X, rename it")
+NEGATIONS = re.compile(r"\b(don'?t|do not|not|never|instead|rather than)\b", re.IGNORECASE)
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _features(query: str) -> List[str]:
+    words = _TOKEN.findall(query.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class IntentClassifier:
+    """Multinomial Naive Bayes over word unigrams and bigrams, updatable one query at a time."""
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self.label_counts = Counter()
+        self.feature_counts = defaultdict(Counter)
+        self.feature_totals = Counter()
+        self.vocabulary = set()
+
+    def __len__(self) -> int:
+        return sum(self.label_counts.values())
+
+    def partial_fit(self, query: str, label: str):
+        features = _features(query)
+        self.label_counts[label] += 1
+        self.feature_counts[label].update(features)
+        self.feature_totals[label] += len(features)
+        self.vocabulary.update(features)
+
+    def fit(self, queries: List[str], labels: List[str]) -> "IntentClassifier":
+        for query, label in zip(queries, labels):
+            self.partial_fit(query, label)
+        return self
+
+    def predict_proba(self, query: str) -> Dict[str, float]:
+        if not self.label_counts:
+            return {}
+        features = _features(query)
+        total = len(self)
+        vocabulary_size = len(self.vocabulary) + 1
+        scores = {}
+        for label, count in self.label_counts.items():
+            denominator = self.feature_totals[label] + self.alpha * vocabulary_size
+            score = math.log(count / total)
+            for feature in features:
+                score += math.log((self.feature_counts[label][feature] + self.alpha) / denominator)
+            scores[label] = score
+        best = max(scores.values())
+        exp_scores = {label: math.exp(score - best) for label, score in scores.items()}
+        norm = sum(exp_scores.values())
+        return {label: value / norm for label, value in exp_scores.items()}
+
+
+def _hinted(query: str) -> List[str]:
+    return [label for label, pattern in QUERY_HINTS.items() if pattern.search(query)]
+
+
+# Negated or conflicting keywords ("don't remove X, rename X") are left to the LLM, the model would follow the keyword
+def ambiguous(query: str) -> bool:
+    return bool(NEGATIONS.search(query)) or len(_hinted(query)) > 1
+
+
+# Keyword rule: exactly one query type is hinted and the query does not lean on earlier context
+def rule_intent(query: str) -> Optional[Tuple[str, float]]:
+    hinted = _hinted(query)
+    if len(hinted) != 1 or CONTEXT_WORDS.search(query):
+        return None
+    return hinted[0], RULE_CONFIDENCE
+
+
+_model: Optional[IntentClassifier] = None
+_model_lock = threading.Lock()
+
+
+def _log_path() -> str:
+    return os.path.join(os.path.dirname(__file__), LOG_FILE)
+
+
+# The classifier fitted on the query log, loaded on first use
+def local_model() -> IntentClassifier:
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = IntentClassifier()
+            if os.path.exists(_log_path()):
+                with open(_log_path(), "r") as fd:
+                    for line in fd:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        if entry.get("type") in QUERY_TYPES:
+                            _model.partial_fit(entry["query"], entry["type"])
+        return _model
+
+
+# Record the LLM's classification of a query as training data for the local model
+def log_query(query: str, response) -> None:
+    if not isinstance(response, dict) or response.get("type") not in QUERY_TYPES:
+        return
+    model = local_model()
+    with _model_lock:
+        model.partial_fit(query, response["type"])
+        with open(_log_path(), "a") as fd:
+            fd.write(json.dumps({"query": query, "type": response["type"]}) + "\n")
+
+
+# Classify a query locally. Returns a response in the query_detection_LLM format, or None if not confident enough.
+def classify_intent(query: str, threshold: float = CONFIDENCE_THRESHOLD) -> Optional[Dict[str, str]]:
+    if ambiguous(query):
+        return None
+    rule = rule_intent(query)
+    model = local_model()
+    # log_query trains the same model from other classifier threads
+    with _model_lock:
+        probabilities = model.predict_proba(query) if len(model) >= MIN_TRAINING_QUERIES else {}
+    label, confidence = rule if rule else (None, 0.0)
+    if probabilities:
+        learned_label = max(probabilities, key=probabilities.get)
+        if rule is None or learned_label == label:
+            # Rule and model are independent evidence for the same label
+            label, confidence = learned_label, 1 - (1 - confidence) * (1 - probabilities[learned_label])
+        else:
+            # Rule and model disagree, leave the decision to the LLM
+            return None
+    if label is None or label == "clarification" or confidence < threshold:
+        return None
+    return {"type": label, "content": query}
@@ -1,8 +1,9 @@
+import re
+import threading
 from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
 from HELPERS import *
-
-_ = load_dotenv()
-client = ai.Client()
+from MODEL import Rating
 
 standard_guideline = """
 Controllability (C), i.e. the ability to avoid the specific harm or damage through timely reactions of the persons 
@@ -163,34 +164,153 @@ def evaluate_hazards(hazards: List[Dict], model="openai:gpt-4o-mini") -> List[Di
     return results
 
 
+# Factorised rating: severity depends only on the harm, exposure only on the operational situation and
+# controllability only on the controllability context. Hazardous events are split into these factors once, every
+# distinct factor is rated once (memoised across runs of the process) and the ratings are combined per event.
+
+FACTOR_BATCH_SIZE = 20
+# Guideline sections: controllability, severity, exposure, general notes
+_GUIDELINE_SECTIONS = re.split(r"-{20,}", standard_guideline)
+FACTORS = {
+    "Severity": ("harm", _GUIDELINE_SECTIONS[1], r"S[0-3]"),
+    "Exposure": ("situation", _GUIDELINE_SECTIONS[2], r"E[0-4]"),
+    "Controllability": ("context", _GUIDELINE_SECTIONS[0], r"C[0-3]"),
+}
+_factor_cache: Dict[tuple, Dict[str, str]] = {}
+# Factors per hazard text, also used as shared hazard context by the other standards
+_hazard_factors: Dict[str, Dict[str, str]] = {}
+_factor_lock = threading.Lock()
+
+
+def _normalise(text: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^\w\s%/-]", " ", str(text).lower())).strip()
+
+
+def _valid_factors(entry: Dict) -> bool:
+    return all(isinstance(entry.get(key), str) and entry[key].strip() for key in ("harm", "situation", "context"))
+
+
+# Split every hazardous event into its harm, operational situation and controllability context
+def extract_factors(hazards: List, model="openai:gpt-4o-mini") -> List[Dict[str, str]]:
+    with _factor_lock:
+        factors = [_hazard_factors.get(str(hazard)) for hazard in hazards]
+    pending = [i for i, f in enumerate(factors) if f is None]
+    for start in range(0, len(pending), FACTOR_BATCH_SIZE):
+        positions = pending[start:start + FACTOR_BATCH_SIZE]
+        chunk = [hazards[i] for i in positions]
+        numbered = "\n".join(f"{i}. {hazard}" for i, hazard in enumerate(chunk, start=1))
+        messages = [
+            {"role": "system", "content":
+            """You are an expert functional safety engineer familiar with the ISO 26262 standard and HARA analysis.
+
+            TASK:
+            - Split every numbered hazardous event into the parts its risk parameters depend on:
+              "harm": the resulting injury, independent of the situation (decides the severity)
+              "situation": the operational situation in which the event can occur (decides the exposure)
+              "context": who could avoid the harm and how (decides the controllability)
+            - Use short, generic wording, so equal harms, situations and contexts are worded equally across events.
+
+            OUTPUT REQUIREMENTS:
+            - Respond only with one valid JSON array with one element per event, in the format
+              [{"idx": 1, "harm": "...", "situation": "...", "context": "..."}]"""},
+            {"role": "user", "content": f"Hazardous events:\n{numbered}"}]
+        response = run_chat(messages=messages, model=model, expected_format="json")
+        for i, entry in index_batch(response, chunk, _valid_factors).items():
+            factors[positions[i]] = {key: _normalise(entry[key]) for key in ("harm", "situation", "context")}
+            with _factor_lock:
+                _hazard_factors[str(chunk[i])] = factors[positions[i]]
+    # Events that could not be split are rated as a whole
+    return [f if f is not None else {key: _normalise(hazard) for key in ("harm", "situation", "context")}
+            for f, hazard in zip(factors, hazards)]
+
+
+def _rate_batch(parameter: str, keys: List[str], model: str) -> Dict[str, Dict[str, str]]:
+    factor, guideline, pattern = FACTORS[parameter]
+    numbered = "\n".join(f"{i}. {key}" for i, key in enumerate(keys, start=1))
+    messages = [
+        {"role": "system", "content":
+        f"""You are an expert functional safety engineer familiar with the ISO 26262 standard and HARA analysis.
+
+        TASK:
+        - Rate the {parameter} of every numbered {factor} following this guideline: {guideline}
+        - {_GUIDELINE_SECTIONS[3]}
+        - If the necessary information can not be derived from the guidance, use UNKNOWN.
+
+        OUTPUT REQUIREMENTS:
+        - Respond only with one valid JSON array with one element per {factor}, in the format
+          [{{"idx": 1, "value": "{pattern[0]}..., UNKNOWN", "reason": "short explanation why this value is assigned"}}]"""},
+        {"role": "user", "content": f"{factor.capitalize()}s:\n{numbered}"}]
+    response = run_chat(messages=messages, model=model, expected_format="json")
+    valid = lambda entry: isinstance(entry.get("value"), str) and \
+        re.fullmatch(pattern + "|UNKNOWN", entry["value"].strip().upper()) is not None
+    return {keys[i]: {"value": entry["value"].strip().upper(), "reason": str(entry.get("reason", ""))}
+            for i, entry in index_batch(response, keys, valid).items()}
+
+
+# Rate each distinct key of one parameter once; keys rated before come from the cache
+def rate_factors(parameter: str, keys: List[str], model="openai:gpt-4o-mini") -> Dict[str, Dict[str, str]]:
+    with _factor_lock:
+        ratings = {key: _factor_cache[(parameter, key)] for key in keys if (parameter, key) in _factor_cache}
+    missing = [key for key in dict.fromkeys(keys) if key not in ratings]
+    for chunk in chunked(missing, FACTOR_BATCH_SIZE):
+        rated = _rate_batch(parameter, chunk, model)
+        # Keys the batch answer skipped are asked for one by one
+        for key in chunk:
+            if key not in rated:
+                rated.update(_rate_batch(parameter, [key], model))
+        with _factor_lock:
+            for key, rating in rated.items():
+                _factor_cache[(parameter, key)] = rating
+        ratings.update(rated)
+    return ratings
+
+
+# Same output as evaluate_hazards, with a cost that grows with the distinct factors instead of the events
+def evaluate_hazards_factorised(hazards: List, model="openai:gpt-4o-mini") -> List[Dict]:
+    factors = extract_factors(hazards, model)
+    with ThreadPoolExecutor(max_workers=len(FACTORS)) as executor:
+        futures = {parameter: executor.submit(rate_factors, parameter, [f[factor] for f in factors], model)
+                   for parameter, (factor, _, _) in FACTORS.items()}
+        ratings = {parameter: future.result() for parameter, future in futures.items()}
+    unknown = {"value": "UNKNOWN", "reason": "Not rated"}
+    results = []
+    for hazard, f in zip(hazards, factors):
+        result = {"hazard": hazard}
+        for parameter, (factor, _, _) in FACTORS.items():
+            result[parameter] = ratings[parameter].get(f[factor], unknown)
+        results.append(result)
+    return results
+
+
 def ASIL_assessment(hazards: List[Dict]) -> List[Dict]:
     for idx, hazard in enumerate(hazards):
         if not isinstance(hazard, dict):
-            hazard = json.loads(hazard)
+            hazard = parse_json(hazard)
+            hazards[idx] = hazard
         print(json.dumps(hazard, indent=4))
-        s = hazard["Severity"]["value"]
-        e = hazard["Exposure"]["value"]
-        c = hazard["Controllability"]["value"]
-        if s != "UNKNOWN" and e != "UNKNOWN" and c != "UNKNOWN":
-            s = int(s[1:])
-            e = int(e[1:])
-            c = int(c[1:])
+        rating = Rating.from_iso(hazard)
+        s, e, c = (rating.parameters[key] for key in ("S", "E", "C"))
+        if s is not None and e is not None and c is not None:
             if (s * e * c) == 0:
                 hazards[idx]["ASIL"] = "-"
             else:
-                hazards[idx]["ASIL"] = ASIL_MATRIX[(s, e, c)]
+                hazards[idx]["ASIL"] = ASIL_MATRIX.get((s, e, c), "UNKNOWN")
         else:
             hazards[idx]["ASIL"] = "UNKNOWN"
     return hazards
 
 
 def extract_json(block):
-    cleaned = re.sub(r"^```json|```$", "", block.strip(), flags=re.MULTILINE).strip()
-    return json.loads(cleaned)
+    if not isinstance(block, str):
+        return block
+    return parse_json(block)
 
 
-def run_risk_assessment(hazards: List[dict], model: str = "openai:gpt-4o-mini") -> List[dict]:
-    result = evaluate_hazards(hazards=hazards, model=model)
+def run_risk_assessment(hazards: List[dict], model: str = "openai:gpt-4o-mini", factorised: bool = False) -> List[dict]:
+    if factorised:
+        result = evaluate_hazards_factorised(hazards=hazards, model=model)
+    else:
+        result = evaluate_hazards(hazards=hazards, model=model)
     result = [extract_json(item) for item in result]
     result = ASIL_assessment(result)
     return result
@@ -0,0 +1,147 @@
+import copy
+from typing import Any, Callable, Dict, List
+
+# RFC 6902 JSON Patch for the analysis documents edited in the feedback loop.
+# The input document is never mutated: every operation copies only the containers on the path to the change and
+# shares all other sub-trees with the input, so a patch costs O(change) instead of O(document).
+
+OPERATIONS = {"add", "remove", "replace", "move", "copy", "test"}
+
+
+class JSONPatchError(ValueError):
+    pass
+
+
+# Split a JSON pointer (RFC 6901) into its unescaped reference tokens
+def parse_pointer(path: str) -> List[str]:
+    if not isinstance(path, str):
+        raise JSONPatchError(f"Path must be a string, got {path!r}")
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise JSONPatchError(f"Path must start with '/': {path!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in path[1:].split("/")]
+
+
+def to_pointer(tokens: List[Any]) -> str:
+    return "".join("/" + str(token).replace("~", "~0").replace("/", "~1") for token in tokens)
+
+
+def _list_index(container: list, token: str, allow_end: bool = False) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise JSONPatchError(f"Invalid array index {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JSONPatchError(f"Array index {index} out of range")
+    return index
+
+
+def _child(node: Any, token: str) -> Any:
+    if isinstance(node, dict):
+        if token not in node:
+            raise JSONPatchError(f"Key {token!r} not found")
+        return node[token]
+    if isinstance(node, list):
+        return node[_list_index(node, token)]
+    raise JSONPatchError(f"Cannot index into {type(node).__name__} with {token!r}")
+
+
+def get_value(doc: Any, path: str) -> Any:
+    node = doc
+    for token in parse_pointer(path):
+        node = _child(node, token)
+    return node
+
+
+# Copy the containers along tokens[:-1] and let change() modify the copied parent of the last token
+def _with_parent(node: Any, tokens: List[str], change: Callable[[Any, str], None]) -> Any:
+    if not isinstance(node, (dict, list)):
+        raise JSONPatchError(f"Cannot index into {type(node).__name__} with {tokens[0]!r}")
+    new_node = dict(node) if isinstance(node, dict) else list(node)
+    if len(tokens) == 1:
+        change(new_node, tokens[0])
+        return new_node
+    key = tokens[0] if isinstance(node, dict) else _list_index(node, tokens[0])
+    new_node[key] = _with_parent(_child(node, tokens[0]), tokens[1:], change)
+    return new_node
+
+
+def _add(doc: Any, tokens: List[str], value: Any) -> Any:
+    if not tokens:
+        return value
+
+    def change(parent, token):
+        if isinstance(parent, list):
+            parent.insert(_list_index(parent, token, allow_end=True), value)
+        else:
+            parent[token] = value
+    return _with_parent(doc, tokens, change)
+
+
+def _remove(doc: Any, tokens: List[str]) -> Any:
+    if not tokens:
+        raise JSONPatchError("Cannot remove the document root")
+
+    def change(parent, token):
+        if isinstance(parent, list):
+            del parent[_list_index(parent, token)]
+        elif token in parent:
+            del parent[token]
+        else:
+            raise JSONPatchError(f"Key {token!r} not found")
+    return _with_parent(doc, tokens, change)
+
+
+def _replace(doc: Any, tokens: List[str], value: Any) -> Any:
+    if not tokens:
+        return value
+
+    def change(parent, token):
+        if isinstance(parent, list):
+            parent[_list_index(parent, token)] = value
+        elif token in parent:
+            parent[token] = value
+        else:
+            raise JSONPatchError(f"Key {token!r} not found")
+    return _with_parent(doc, tokens, change)
+
+
+def apply_operation(doc: Any, operation: Dict[str, Any]) -> Any:
+    if not isinstance(operation, dict) or operation.get("op") not in OPERATIONS:
+        raise JSONPatchError(f"Invalid operation {operation!r}")
+    op = operation["op"]
+    tokens = parse_pointer(operation.get("path"))
+    if op in ("add", "replace", "test") and "value" not in operation:
+        raise JSONPatchError(f"Operation {op!r} requires a value")
+
+    if op == "add":
+        return _add(doc, tokens, operation["value"])
+    if op == "remove":
+        return _remove(doc, tokens)
+    if op == "replace":
+        return _replace(doc, tokens, operation["value"])
+    if op == "test":
+        if get_value(doc, operation["path"]) != operation["value"]:
+            raise JSONPatchError(f"Test failed at {operation['path']!r}")
+        return doc
+
+    source = parse_pointer(operation.get("from"))
+    value = get_value(doc, operation["from"])
+    if op == "move":
+        if tokens[:len(source)] == source and tokens != source:
+            raise JSONPatchError("Cannot move a value into one of its children")
+        return _add(_remove(doc, source), tokens, value)
+    return _add(doc, tokens, copy.deepcopy(value))
+
+
+# Apply all operations or none: the input document is returned unchanged by raising on the first invalid operation
+def apply_patch(doc: Any, patch: List[Dict[str, Any]]) -> Any:
+    if isinstance(patch, dict):
+        patch = [patch]
+    if not isinstance(patch, list):
+        raise JSONPatchError(f"Patch must be a list of operations, got {type(patch).__name__}")
+    for operation in patch:
+        doc = apply_operation(doc, operation)
+    return doc
@@ -0,0 +1,258 @@
+import json
+import re
+import time
+from typing import Any
+
+# Tolerant JSON parser for LLM output.
+# Valid JSON (optionally wrapped in fences or prose) is decoded by the C decoder via raw_decode, everything else is
+# repaired in one left-to-right scan over the text. The content of a markdown fence is parsed first, without a fence
+# the first bracket is the start: leading/trailing prose is skipped, single
+# quoted strings, Python literals, trailing or missing commas, unquoted keys, set-like objects ({'a', 'b'}) and
+# truncated output (unterminated strings, unclosed brackets) are accepted. Apostrophes inside strings are kept.
+
+_decoder = json.JSONDecoder()
+
+_WHITESPACE = re.compile(r"[\s,]*")
+_STRING_CHUNK = {
+    '"': re.compile(r'[^"\\]*'),
+    "'": re.compile(r"[^'\\]*"),
+}
+_HEX4 = re.compile(r"[0-9a-fA-F]{4}")
+_BARE_WORD = re.compile(r"[^\s,:\[\]{}\"']+")
+_NUMBER = re.compile(r"-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$")
+_LITERALS = {
+    "true": True, "false": False, "null": None,
+    "True": True, "False": False, "None": None,
+}
+_ESCAPES = {'"': '"', "'": "'", "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_CLOSERS = {"{": "}", "[": "]"}
+_FENCE = re.compile(r"```[A-Za-z]*[^\S\n]*\n?(.*?)(?:```|$)", re.DOTALL)
+
+
+class JSONRepairError(ValueError):
+    pass
+
+
+class _Scanner:
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+        self.end = len(text)
+
+    def skip(self):
+        # Whitespace and stray commas carry no information between values
+        self.pos = _WHITESPACE.match(self.text, self.pos).end()
+
+    def peek(self) -> str:
+        return self.text[self.pos] if self.pos < self.end else ""
+
+    def value(self) -> Any:
+        self.skip()
+        char = self.peek()
+        if char == "{":
+            return self.obj()
+        if char == "[":
+            return self.array()
+        if char in "\"'":
+            return self.string()
+        return self.bare()
+
+    def string(self) -> str:
+        quote = self.text[self.pos]
+        self.pos += 1
+        chunk = _STRING_CHUNK[quote]
+        parts = []
+        while self.pos < self.end:
+            match = chunk.match(self.text, self.pos)
+            parts.append(match.group())
+            self.pos = match.end()
+            if self.pos >= self.end:
+                break
+            char = self.text[self.pos]
+            if char == "\\":
+                escaped = self.text[self.pos + 1:self.pos + 2]
+                if escaped == "u" and _HEX4.match(self.text, self.pos + 2, self.end):
+                    parts.append(chr(int(self.text[self.pos + 2:self.pos + 6], 16)))
+                    self.pos += 6
+                elif escaped == "u":
+                    # Invalid or truncated escape, kept as written
+                    parts.append("\\u")
+                    self.pos += 2
+                else:
+                    parts.append(_ESCAPES.get(escaped, escaped))
+                    self.pos += 2
+                continue
+            # A quote only terminates the string if structure follows, so "the driver's seat" survives
+            self.pos += 1
+            after = _WHITESPACE.match(self.text, self.pos).end()
+            if after >= self.end or self.text[after] in ":]}" or self.text[after - 1:after] == "," \
+                    or self.text[after] in "\"'{[":
+                break
+            parts.append(quote)
+        return "".join(parts)
+
+    def bare(self) -> Any:
+        match = _BARE_WORD.match(self.text, self.pos)
+        if not match:
+            # Unexpected structural character, e.g. a ':' without a key
+            self.pos += 1
+            return None
+        word = match.group()
+        self.pos = match.end()
+        if word in _LITERALS:
+            return _LITERALS[word]
+        if _NUMBER.match(word):
+            return float(word) if any(c in word for c in ".eE") else int(word)
+        return word
+
+    def array(self) -> list:
+        self.pos += 1
+        items = []
+        while True:
+            self.skip()
+            char = self.peek()
+            if char == "" or char == "]":
+                self.pos += 1
+                return items
+            if char == "}":
+                # Mismatched closer, treat it as the end of this array
+                self.pos += 1
+                return items
+            items.append(self.value())
+
+    def obj(self) -> Any:
+        self.pos += 1
+        result = {}
+        as_set = None
+        while True:
+            self.skip()
+            char = self.peek()
+            if char == "" or char in "}]":
+                self.pos += 1
+                return as_set if as_set is not None else result
+            key = self.value()
+            self.skip()
+            if self.peek() == ":":
+                self.pos += 1
+                self.skip()
+                if self.peek() in ("", "}"):
+                    # Truncated or empty value, drop the dangling key
+                    continue
+                result[str(key)] = self.value()
+            elif self.peek() in ("", "}", "]") and key is not None and as_set is None and result:
+                # Truncated after a key, drop the dangling key
+                continue
+            else:
+                # Python set literal or a list written with braces
+                if as_set is None:
+                    as_set = list(result.values())
+                as_set.append(key)
+
+
+# Locate the first JSON container, skipping prose in front of it
+def _find_start(text: str) -> int:
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return -1
+    return min(starts)
+
+
+# Content of the first markdown code block, an unclosed block (truncated output) runs to the end of the text
+def _fenced(text: str):
+    match = _FENCE.search(text)
+    return match.group(1) if match else None
+
+
+def _parse_from_start(text: str) -> Any:
+    start = _find_start(text)
+    if start == -1:
+        raise JSONRepairError("No JSON object or array found")
+    try:
+        value, _ = _decoder.raw_decode(text, start)
+        return value
+    except json.JSONDecodeError:
+        pass
+    scanner = _Scanner(text)
+    scanner.pos = start
+    return scanner.value()
+
+
+# A fenced block is the intended answer, brackets in the prose around it must not be parsed instead
+def parse_json(text: str) -> Any:
+    if not isinstance(text, str):
+        raise JSONRepairError(f"Expected a string, got {type(text).__name__}")
+    fenced = _fenced(text)
+    if fenced is not None:
+        try:
+            return _parse_from_start(fenced)
+        except (JSONRepairError, RecursionError):
+            pass
+    return _parse_from_start(text)
+
+
+# Parse LLM output and fall back to the given default instead of raising
+def parse_json_or(text: str, default: Any = None) -> Any:
+    try:
+        return parse_json(text)
+    except (JSONRepairError, RecursionError, ValueError):
+        return default
+
+
+# Malformed outputs collected from the HARA and risk assessment prompts
+BENCHMARK_CORPUS = [
+    '```json\n[{"name": "Operator", "role": "Controls the drone."}, {"name": "Bystander", "role": "Passes by."}]\n```',
+    'Here is the result:\n{"type": "refactor", "content": "Rename the Operator to Pilot"}\nLet me know if you need more.',
+    "{'name': 'Cargo Drone', 'description': 'Carries cargo up to 5kg with a speed of 3m/s'}",
+    "{'type': 'get', 'content': 'Show the driver's hazards'}",
+    '["Mechanical", "Kinetic", "Electrical",]',
+    '[{"failure_mode": "Timing Early", "description": "Actuated earlier than intended."}\n'
+    ' {"failure_mode": "Timing Late", "description": "Actuated later than intended."}]',
+    """{
+        'Electric shock or electrical burns', 'Thermal burns', 'Pinching or impact injuries', 'Bruising'
+        }""",
+    """{
+        'question': 'To which failure would a Provision Comission of actuator Rotors lead?',
+        'failures': ['One or more rotors start to rotate', 'One or more rotors stop rotating too late']
+        }]""",
+    '[{"hazard": "Crushing", "C": {"value": "C3", "rationale": "Major injury"}, "F": {"value": "F2"',
+    '{"impact_class": "Moving parts", "physical_value": ["Fork lift speed", "Fork lift hei',
+    '```json\n{"standard_name": "Road vehicles - Functional safety", "standard_reference": "ISO 26262",}\n```',
+    'The persons [see below] are:\n```json\n[{"name": "Driver", "role": "Drives the vehicle."}]\n```',
+]
+
+
+# Micro-benchmark against the previous multi-attempt strategy (json.loads, literal_eval, quote replacement)
+def _legacy_parse(text: str) -> Any:
+    import ast
+    clean_content = text.replace("```json", "").replace("```", "").strip()
+    try:
+        return json.loads(clean_content)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return ast.literal_eval(clean_content)
+    except (ValueError, SyntaxError):
+        pass
+    match = re.search(r"(\[.*\]|\{.*\})", clean_content, re.DOTALL)
+    if match:
+        try:
+            return json.loads(match.group(1).replace("'", '"'))
+        except json.JSONDecodeError:
+            pass
+    return None
+
+
+def benchmark(rounds: int = 2000):
+    for name, parser in (("legacy", _legacy_parse), ("parse_json", lambda t: parse_json_or(t))):
+        parsed = sum(parser(text) is not None for text in BENCHMARK_CORPUS)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in BENCHMARK_CORPUS:
+                parser(text)
+        elapsed = time.perf_counter() - start
+        per_call = elapsed / (rounds * len(BENCHMARK_CORPUS)) * 1e6
+        print(f"{name:>10}: {parsed}/{len(BENCHMARK_CORPUS)} parsed, {per_call:.1f} us per document")
+
+
+if __name__ == "__main__":
+    benchmark()
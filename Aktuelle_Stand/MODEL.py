@@ -0,0 +1,358 @@
+import json
+import sys
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Typed record layer for the HARA pipeline data.
+# Records are slotted dataclasses that refer to each other by integer ID, all text goes through one interning
+# string pool, and the failure matrix is stored column-wise in integer arrays. Joins are integer comparisons and
+# a large failure matrix costs a few bytes per cell instead of a dict per cell.
+
+
+class StringPool:
+    """Interns strings and maps them to dense integer IDs."""
+
+    __slots__ = ("ids", "strings")
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.strings: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def id(self, text: Any) -> int:
+        text = sys.intern(str(text))
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.ids[text] = string_id
+            self.strings.append(text)
+        return string_id
+
+    def get(self, string_id: int) -> str:
+        return self.strings[string_id]
+
+
+@dataclass(slots=True)
+class System:
+    name: str
+    description: str
+
+
+@dataclass(slots=True)
+class Person:
+    id: int
+    name: str
+    role: str
+
+
+@dataclass(slots=True)
+class Hazard:
+    id: int
+    hazard_class: str
+
+
+@dataclass(slots=True)
+class Harm:
+    id: int
+    person_id: int
+    hazard_id: int
+    harm: str
+    guide_phrase: str = ""
+
+
+@dataclass(slots=True)
+class Impact:
+    id: int
+    impact_class: str
+    harm_caused: str
+    physical_values: Tuple[str, ...] = ()
+
+
+@dataclass(slots=True)
+class FailureMode:
+    id: int
+    name: str
+    description: str
+
+
+@dataclass(slots=True)
+class Actuator:
+    id: int
+    name: str
+    impact_class: str
+
+
+@dataclass(slots=True)
+class Failure:
+    failure_mode_id: int
+    actuator_id: int
+    impact_id: int
+    failure: str
+
+
+@dataclass(slots=True)
+class Rating:
+    """Risk parameters of one hazard. ISO 26262 uses S/E/C, IEC 61508 uses C/F/P/W. Levels are ints, None if unknown."""
+    hazard: str
+    parameters: Dict[str, Optional[int]] = field(default_factory=dict)
+    integrity_level: str = ""
+
+    # Parse "S2" style values, also inside {"value": "S2", "reason": ...} objects
+    @staticmethod
+    def level(value: Any) -> Optional[int]:
+        if isinstance(value, dict):
+            value = value.get("value")
+        text = str(value).strip()
+        return int(text[1:]) if len(text) > 1 and text[1:].isdigit() else None
+
+    @classmethod
+    def from_iso(cls, entry: Dict[str, Any]) -> "Rating":
+        return cls(hazard=str(entry.get("hazard", "")),
+                   parameters={"S": cls.level(entry.get("Severity")), "E": cls.level(entry.get("Exposure")),
+                               "C": cls.level(entry.get("Controllability"))},
+                   integrity_level=str(entry.get("ASIL", "")))
+
+    @classmethod
+    def from_iec(cls, entry: Dict[str, Any]) -> "Rating":
+        return cls(hazard=str(entry.get("hazard", "")),
+                   parameters={key: cls.level(entry.get(key)) for key in ("C", "F", "P", "W")},
+                   integrity_level=str(entry.get("SIL", "")))
+
+
+class FailureTable:
+    """Failure matrix stored column-wise: one unsigned int array per column, failure texts as string pool IDs."""
+
+    __slots__ = ("strings", "failure_modes", "actuators", "impacts", "failures")
+
+    def __init__(self, strings: StringPool):
+        self.strings = strings
+        self.failure_modes = array("I")
+        self.actuators = array("I")
+        self.impacts = array("I")
+        self.failures = array("I")
+
+    def __len__(self) -> int:
+        return len(self.failures)
+
+    def add(self, failure_mode_id: int, actuator_id: int, impact_id: int, failure: str):
+        self.failure_modes.append(failure_mode_id)
+        self.actuators.append(actuator_id)
+        self.impacts.append(impact_id)
+        self.failures.append(self.strings.id(failure))
+
+    def __iter__(self) -> Iterator[Failure]:
+        for i in range(len(self)):
+            yield Failure(self.failure_modes[i], self.actuators[i], self.impacts[i],
+                          self.strings.get(self.failures[i]))
+
+    # Row indices of one actuator's failures, compared by ID
+    def rows_for_actuator(self, actuator_id: int) -> List[int]:
+        return [i for i, value in enumerate(self.actuators) if value == actuator_id]
+
+
+class HaraStore:
+    """All records of one HARA, with ID based lookups and (de)serialisation to the FINAL_HARA.json layout."""
+
+    def __init__(self):
+        self.strings = StringPool()
+        self.system: Optional[System] = None
+        self.persons: List[Person] = []
+        self.hazards: List[Hazard] = []
+        self.harms: List[Harm] = []
+        self.harms_summary: List[str] = []
+        self.impacts: List[Impact] = []
+        self.failure_modes: List[FailureMode] = []
+        self.actuators: List[Actuator] = []
+        self.failures = FailureTable(self.strings)
+        self._person_ids: Dict[str, int] = {}
+        self._hazard_ids: Dict[str, int] = {}
+        self._impact_ids: Dict[Tuple[str, str], int] = {}
+        self._failure_mode_ids: Dict[str, int] = {}
+        self._actuator_ids: Dict[str, int] = {}
+
+    def _text(self, value: Any) -> str:
+        return self.strings.get(self.strings.id(value))
+
+    # Harms are keyed by person name, so a repeated name is the same person: the existing ID is returned and an
+    # empty role is filled in
+    def add_person(self, name: str, role: str = "") -> int:
+        name = self._text(name)
+        if name in self._person_ids:
+            person = self.persons[self._person_ids[name]]
+            if not person.role and role:
+                person.role = self._text(role)
+        else:
+            self._person_ids[name] = len(self.persons)
+            self.persons.append(Person(len(self.persons), name, self._text(role)))
+        return self._person_ids[name]
+
+    def add_hazard(self, hazard_class: str) -> int:
+        hazard_class = self._text(hazard_class)
+        if hazard_class not in self._hazard_ids:
+            self._hazard_ids[hazard_class] = len(self.hazards)
+            self.hazards.append(Hazard(len(self.hazards), hazard_class))
+        return self._hazard_ids[hazard_class]
+
+    def add_harm(self, person_id: int, hazard_id: int, harm: str, guide_phrase: str = "") -> int:
+        self.harms.append(Harm(len(self.harms), person_id, hazard_id, self._text(harm), self._text(guide_phrase)))
+        return len(self.harms) - 1
+
+    # Impacts, failure modes and actuators are added once, adding them again returns the existing ID
+    def add_impact(self, impact_class: str, harm_caused: str, physical_values=()) -> int:
+        key = (self._text(impact_class), self._text(harm_caused))
+        if key not in self._impact_ids:
+            values = tuple(self._text(value) for value in (physical_values or ()))
+            self._impact_ids[key] = len(self.impacts)
+            self.impacts.append(Impact(len(self.impacts), key[0], key[1], values))
+        return self._impact_ids[key]
+
+    def add_failure_mode(self, name: str, description: str = "") -> int:
+        name = self._text(name)
+        if name not in self._failure_mode_ids:
+            self._failure_mode_ids[name] = len(self.failure_modes)
+            self.failure_modes.append(FailureMode(len(self.failure_modes), name, self._text(description)))
+        return self._failure_mode_ids[name]
+
+    def add_actuator(self, name: str, impact_class: str = "") -> int:
+        name = self._text(name)
+        if name not in self._actuator_ids:
+            self._actuator_ids[name] = len(self.actuators)
+            self.actuators.append(Actuator(len(self.actuators), name, self._text(impact_class)))
+        return self._actuator_ids[name]
+
+    # One failure matrix cell, the records are joined by ID
+    def add_failure(self, failure_mode: str, actuator: str, impact_class: str, harm_caused: str, failure: str):
+        self.failures.add(self.add_failure_mode(failure_mode), self.add_actuator(actuator),
+                          self.add_impact(impact_class, harm_caused), failure)
+
+    def person_id(self, name: str) -> Optional[int]:
+        return self._person_ids.get(name)
+
+    def hazard_id(self, hazard_class: str) -> Optional[int]:
+        return self._hazard_ids.get(hazard_class)
+
+    def harms_of(self, person_id: int) -> List[Harm]:
+        return [harm for harm in self.harms if harm.person_id == person_id]
+
+    # The failure matrix as rows of names, the layout of FINAL_HARA.json and from_pipeline
+    def failure_rows(self) -> List[Dict[str, str]]:
+        return [{"failure_mode": self.failure_modes[f.failure_mode_id].name,
+                 "actuator": self.actuators[f.actuator_id].name,
+                 "impact_class": self.impacts[f.impact_id].impact_class,
+                 "harm_caused": self.impacts[f.impact_id].harm_caused,
+                 "failure": f.failure} for f in self.failures]
+
+    # Build the store from the outputs of the HARA steps as returned by HARA.py. failures are failure matrix rows
+    # (failure_rows layout); HARA.collect_failures fills a store directly when one is passed.
+    @classmethod
+    def from_pipeline(cls, system: Dict = None, persons: List[Dict] = (), hazards: List[str] = (),
+                      harms: Dict[str, List[Dict]] = None, harms_summary: List[str] = (),
+                      impacts: Dict[str, List[Dict]] = None, failure_modes: List[Dict] = (),
+                      actuators: List[Dict] = (), failures: List[Dict[str, str]] = ()) -> "HaraStore":
+        store = cls()
+        if isinstance(system, dict):
+            store.system = System(store._text(system.get("name", "")), store._text(system.get("description", "")))
+        for person in persons or ():
+            store.add_person(person.get("name", ""), person.get("role", ""))
+        for hazard in hazards or ():
+            store.add_hazard(hazard)
+        for person_name, person_harms in (harms or {}).items():
+            person_id = store.add_person(person_name)
+            for harm in person_harms:
+                if isinstance(harm, dict):
+                    hazard_id = store.add_hazard(harm.get("hazard_class", ""))
+                    store.add_harm(person_id, hazard_id, harm.get("harm", ""), harm.get("guide_phrase", ""))
+        store.harms_summary = [store._text(harm) for harm in harms_summary or ()]
+        for impact_class, impact_list in (impacts or {}).items():
+            for impact in impact_list:
+                if isinstance(impact, dict):
+                    store.add_impact(impact_class, impact.get("harm_caused", ""), impact.get("physical_value", ()))
+        for mode in failure_modes or ():
+            store.add_failure_mode(mode.get("failure_mode", ""), mode.get("description", ""))
+        for entry in actuators or ():
+            for actuator in entry.get("actuators", []):
+                store.add_actuator(actuator, entry.get("impact_class", ""))
+        for row in failures or ():
+            store.add_failure(row.get("failure_mode", ""), row.get("actuator", ""), row.get("impact_class", ""),
+                              row.get("harm_caused", ""), row.get("failure", ""))
+        return store
+
+    @classmethod
+    def from_final_hara(cls, final_hara: Dict[str, Any]) -> "HaraStore":
+        return cls.from_pipeline(system=final_hara.get("System Under Analysis"),
+                                 persons=final_hara.get("Persons At Risk"),
+                                 hazards=final_hara.get("Hazards"),
+                                 harms_summary=final_hara.get("Harms Summary"),
+                                 impacts=final_hara.get("Impact"),
+                                 failure_modes=final_hara.get("Failure Modes"),
+                                 actuators=final_hara.get("Actuators"),
+                                 failures=final_hara.get("Failures"))
+
+    def to_final_hara(self) -> Dict[str, Any]:
+        impacts = {}
+        for impact in self.impacts:
+            impacts.setdefault(impact.impact_class, []).append(
+                {"impact_class": impact.impact_class, "physical_value": list(impact.physical_values),
+                 "harm_caused": impact.harm_caused})
+        actuators = {}
+        for actuator in self.actuators:
+            actuators.setdefault(actuator.impact_class, []).append(actuator.name)
+        return {
+            "System Under Analysis": {"name": self.system.name, "description": self.system.description}
+            if self.system else {},
+            "Persons At Risk": [{"name": p.name, "role": p.role} for p in self.persons],
+            "Hazards": [h.hazard_class for h in self.hazards],
+            "Harms Summary": list(self.harms_summary),
+            "Impact": impacts,
+            "Failure Modes": [{"failure_mode": m.name, "description": m.description} for m in self.failure_modes],
+            "Actuators": [{"impact_class": ic, "actuators": names} for ic, names in actuators.items()],
+            "Failures": self.failure_rows(),
+        }
+
+    # Compact column-wise serialisation: every text is stored once and records refer to it by string ID
+    def dumps(self) -> str:
+        s = self.strings.id
+        return json.dumps({
+            "strings": self.strings.strings,
+            "system": [s(self.system.name), s(self.system.description)] if self.system else None,
+            "persons": [[s(p.name), s(p.role)] for p in self.persons],
+            "hazards": [s(h.hazard_class) for h in self.hazards],
+            "harms": [[h.person_id, h.hazard_id, s(h.harm), s(h.guide_phrase)] for h in self.harms],
+            "harms_summary": [s(h) for h in self.harms_summary],
+            "impacts": [[s(i.impact_class), s(i.harm_caused), [s(v) for v in i.physical_values]] for i in self.impacts],
+            "failure_modes": [[s(m.name), s(m.description)] for m in self.failure_modes],
+            "actuators": [[s(a.name), s(a.impact_class)] for a in self.actuators],
+            "failures": [self.failures.failure_modes.tolist(), self.failures.actuators.tolist(),
+                         self.failures.impacts.tolist(), self.failures.failures.tolist()],
+        }, separators=(",", ":"))
+
+    @classmethod
+    def loads(cls, data: str) -> "HaraStore":
+        raw = json.loads(data)
+        store = cls()
+        strings = raw["strings"]
+        for text in strings:
+            store.strings.id(text)
+        t = store.strings.get
+        if raw.get("system"):
+            store.system = System(t(raw["system"][0]), t(raw["system"][1]))
+        for name, role in raw["persons"]:
+            store.add_person(t(name), t(role))
+        for hazard in raw["hazards"]:
+            store.add_hazard(t(hazard))
+        for person_id, hazard_id, harm, guide_phrase in raw["harms"]:
+            store.harms.append(Harm(len(store.harms), person_id, hazard_id, t(harm), t(guide_phrase)))
+        store.harms_summary = [t(h) for h in raw["harms_summary"]]
+        for impact_class, harm_caused, values in raw["impacts"]:
+            store.add_impact(t(impact_class), t(harm_caused), [t(v) for v in values])
+        for name, description in raw["failure_modes"]:
+            store.add_failure_mode(t(name), t(description))
+        for name, impact_class in raw["actuators"]:
+            store.add_actuator(t(name), t(impact_class))
+        for column, values in zip((store.failures.failure_modes, store.failures.actuators, store.failures.impacts,
+                                   store.failures.failures), raw["failures"]):
+            column.extend(values)
+        return store
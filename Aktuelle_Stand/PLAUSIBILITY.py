@@ -0,0 +1,131 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from HELPERS import run_chat_hara, index_batch, system_fingerprint
+
+# Plausibility pre-filter for the person x hazard class matrix of HARA.harms.
+# Every cell is scored between 0 and 1 before the expensive harm definition: cells judged in earlier runs on the same
+# system come from a local cache, all other cells are scored together in one matrix request. Cells below the
+# threshold are not sent to define_harm and are returned with their score, so the HARA output can record the pruning.
+
+CACHE_FILE = "plausibility_cache.jsonl"
+PLAUSIBILITY_THRESHOLD = 0.3
+
+_cache: Optional[Dict[Tuple[str, str, str], float]] = None
+_cache_lock = threading.Lock()
+
+
+def _cache_path() -> str:
+    return os.path.join(os.path.dirname(__file__), CACHE_FILE)
+
+
+# A judgement only holds for the system it was made for
+def _key(system: str, person: str, hazard: str) -> Tuple[str, str, str]:
+    return system, person.strip().lower(), hazard.strip().lower()
+
+
+# Judgements of earlier runs, loaded on first use. Entries without a system fingerprint are ignored.
+def cached_scores() -> Dict[Tuple[str, str, str], float]:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = {}
+            if os.path.exists(_cache_path()):
+                with open(_cache_path(), "r") as fd:
+                    for line in fd:
+                        try:
+                            entry = json.loads(line)
+                            _cache[_key(entry["system"], entry["person"], entry["hazard"])] = float(entry["score"])
+                        except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                            continue
+        return _cache
+
+
+def _store_scores(scores: Dict[Tuple[str, str, str], float]) -> None:
+    cache = cached_scores()
+    with _cache_lock:
+        cache.update(scores)
+        with open(_cache_path(), "a") as fd:
+            for (system, person, hazard), score in scores.items():
+                fd.write(json.dumps({"system": system, "person": person, "hazard": hazard, "score": score}) + "\n")
+
+
+def _valid_row(length: int):
+    def valid(entry: Dict[str, Any]) -> bool:
+        scores = entry.get("scores")
+        return isinstance(scores, list) and len(scores) == length and \
+            all(isinstance(s, (int, float)) and not isinstance(s, bool) for s in scores)
+    return valid
+
+
+# Score all person x hazard class cells in one request; rows that come back invalid are missing in the result
+def score_matrix(system: json, persons: List[Dict[str, str]], hazards: List[str],
+                 model: str = "openai:gpt-4o-mini") -> Dict[Tuple[str, str, str], float]:
+    system_prompt = {
+        "role": "system",
+        "content": f"""
+        You are an expert in Hazard Analysis and Risk Assessment (HARA).
+
+        TASK:
+        Based on the provided system description, rate for every numbered person and every hazard class how plausible it is that the system harms the person through the hazard class.
+        Use 0 for implausible (the person never gets in reach of the hazard), 1 for clearly plausible, and values in between if unsure. If in doubt, rate higher.
+
+        OUTPUT FORMAT:
+        Return only a valid JSON array with one element per person, where each element has exactly these keys:
+        - "idx": (integer, the number of the person in the given list)
+        - "scores": (array of numbers between 0 and 1, one per hazard class in the given order)
+        """}
+
+    numbered = " ".join(f"{i}. {p['name']} ({p.get('role', '')})" for i, p in enumerate(persons, start=1))
+    response = run_chat_hara(
+        messages=[
+            system_prompt,
+            {
+                "role": "user",
+                "content": f"Rate the plausibility of every cell. Here is the given system: {system}, the persons: {numbered}, and the hazard classes in order: {hazards}"
+            }],
+        model=model,
+        expected_format="json",
+        temperature=0.0)
+
+    fingerprint = system_fingerprint(system)
+    scores = {}
+    for i, row in index_batch(response, persons, _valid_row(len(hazards))).items():
+        for hazard, score in zip(hazards, row["scores"]):
+            scores[_key(fingerprint, persons[i]["name"], hazard)] = min(max(float(score), 0.0), 1.0)
+    return scores
+
+
+# Split the matrix into the hazard classes to define per person and the pruned cells (person, hazard, score).
+# Cells without a score are kept, pruning only happens on an explicit judgement.
+def plausible_pairs(system: json, persons: List[Dict[str, str]], hazards: List[str],
+                    model: str = "openai:gpt-4o-mini", threshold: float = PLAUSIBILITY_THRESHOLD):
+    cache = cached_scores()
+    fingerprint = system_fingerprint(system)
+    unknown = [p for p in persons if any(_key(fingerprint, p["name"], h) not in cache for h in hazards)]
+    scores = {}
+    if unknown:
+        scored = score_matrix(system, unknown, hazards, model)
+        if scored:
+            _store_scores(scored)
+        scores.update(scored)
+
+    kept = {}
+    pruned = []
+    for p in persons:
+        kept[p["name"]] = []
+        for h in hazards:
+            key = _key(fingerprint, p["name"], h)
+            score = scores.get(key, cache.get(key))
+            if score is not None and score < threshold:
+                pruned.append({"person": p["name"], "hazard": h, "score": score})
+            else:
+                kept[p["name"]].append(h)
+    return kept, pruned
+
+
+def report_pruned(pruned: List[Dict[str, Any]], total: int) -> None:
+    print(f"--- Plausibility filter pruned {len(pruned)} of {total} person x hazard cells")
+    for cell in pruned:
+        print(f"    {cell['person']} x {cell['hazard']} (score {cell['score']:.2f})")
@@ -0,0 +1,249 @@
+import re
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from HELPERS import run_chat
+from JSON_PATCH import to_pointer
+
+# Local query engine for "get" requests on HARA and risk assessment data.
+# Records are the entries of the lists in an analysis (persons, harms, rated hazards, ...). They are indexed by
+# field value and by token once per analysis, so a query is answered from in-memory postings instead of an LLM call.
+#
+# Query language (conditions joined by "and"):
+#   [entity] [where] <field> <op> <value> and ...
+#   op: = != > >= < <= ~ (contains), "contains" / "involving" for text search
+# e.g. "hazards where ASIL >= C and person = Driver", "harms contains crushing", "SIL >= 2"
+
+ASIL_ORDER = ["QM", "A", "B", "C", "D"]
+FIELD_ALIASES = {
+    "person": ["person", "name", "group"],
+    "harm": ["harm", "harm_caused", "text"],
+    "hazard": ["hazard", "hazard_class", "text"],
+    "severity": ["severity", "s"],
+    "exposure": ["exposure", "e"],
+    "controllability": ["controllability"],
+}
+
+_CONDITION = re.compile(
+    r"^\s*(?P<field>[\w ]+?)\s*(?P<op>>=|<=|!=|=|>|<|~|\bcontains\b|\binvolving\b)\s*(?P<value>.+?)\s*$",
+    re.IGNORECASE)
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+class QueryError(ValueError):
+    pass
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN.findall(str(text).lower())
+
+
+# Value on an ordered scale: ASIL letters, or the number in values like "S2", "E4", "SIL 3", "F1"
+def rank(value: Any) -> Optional[float]:
+    text = str(value).strip().upper().replace("ASIL", "").replace("SIL", "").strip()
+    if text in ASIL_ORDER:
+        return float(ASIL_ORDER.index(text))
+    if text in ("-", "QM"):
+        return 0.0
+    match = re.search(r"(\d+(?:\.\d+)?)$", text)
+    return float(match.group(1)) if match else None
+
+
+def _flatten(record: Any, group: Optional[str]) -> Dict[str, str]:
+    fields = {}
+    if isinstance(record, dict):
+        for key, value in record.items():
+            # Ratings are stored as {"value": ..., "reason": ...}
+            if isinstance(value, dict) and "value" in value:
+                value = value["value"]
+            if isinstance(value, list):
+                value = ", ".join(str(v) for v in value)
+            if not isinstance(value, dict):
+                fields[str(key).strip(" :").lower()] = str(value)
+    else:
+        fields["text"] = str(record)
+    if group is not None:
+        fields["group"] = group
+    return fields
+
+
+def _iter_entries(analysis: Any) -> List[Tuple[Tuple, Any, Optional[str], Optional[str]]]:
+    # (path, record, group, section): list entries of the root, of root values and of their values
+    entries = []
+
+    def walk(node, path, group, section, depth):
+        if isinstance(node, list):
+            for i, item in enumerate(node):
+                if isinstance(item, list):
+                    walk(item, path + (i,), group, section, depth + 1)
+                else:
+                    entries.append((path + (i,), item, group, section))
+        elif isinstance(node, dict) and depth < 2:
+            # The key of a dict of lists is the group of its entries (a person, an impact class, ...)
+            for key, value in node.items():
+                walk(value, path + (key,), key, section if section is not None else key, depth + 1)
+
+    walk(analysis, (), None, None, 0)
+    if not entries and isinstance(analysis, dict):
+        entries.append(((), analysis, None, None))
+    return entries
+
+
+class QueryIndex:
+    def __init__(self, analysis: Any):
+        self.analysis = analysis
+        self.entries = _iter_entries(analysis)
+        self.fields = [_flatten(record, group) for _, record, group, _ in self.entries]
+        self.by_value: Dict[str, Dict[str, Set[int]]] = defaultdict(lambda: defaultdict(set))
+        self.by_token: Dict[str, Set[int]] = defaultdict(set)
+        self.by_section: Dict[str, Set[int]] = defaultdict(set)
+        for i, fields in enumerate(self.fields):
+            for field, value in fields.items():
+                self.by_value[field][value.lower()].add(i)
+                for token in _tokens(value):
+                    self.by_token[token].add(i)
+            section = self.entries[i][3]
+            if section is not None:
+                self.by_section[section.lower()].add(i)
+        self.all = set(range(len(self.entries)))
+
+    def _resolve_field(self, field: str) -> List[str]:
+        field = field.strip().lower()
+        candidates = FIELD_ALIASES.get(field, [field])
+        return [f for f in candidates if f in self.by_value] or [f for f in self.by_value if field in f]
+
+    def _text_search(self, text: str, fields: Optional[List[str]] = None) -> Set[int]:
+        hits = None
+        for token in _tokens(text):
+            postings = self.by_token.get(token, set())
+            hits = postings if hits is None else hits & postings
+        hits = hits if hits is not None else set()
+        if fields:
+            hits = {i for i in hits if any(text.lower() in self.fields[i].get(f, "").lower() for f in fields)}
+        return hits
+
+    def _condition(self, field: str, op: str, value: str) -> Set[int]:
+        op = op.lower()
+        value = value.strip().strip("'\"")
+        fields = self._resolve_field(field)
+        if op in ("~", "contains", "involving"):
+            return self._text_search(value, fields if field.lower() not in ("text", "any") else None)
+        if not fields:
+            raise QueryError(f"Unknown field {field!r}")
+        hits = set()
+        for f in fields:
+            if op in ("=", "!="):
+                matches = set()
+                for stored, postings in self.by_value[f].items():
+                    if stored == value.lower() or rank(stored) is not None and rank(stored) == rank(value):
+                        matches |= postings
+                hits |= matches if op == "=" else self.all - matches
+                continue
+            target = rank(value)
+            if target is None:
+                raise QueryError(f"{value!r} is not on an ordered scale")
+            for stored, postings in self.by_value[f].items():
+                current = rank(stored)
+                if current is None:
+                    continue
+                if (op == ">" and current > target) or (op == ">=" and current >= target) or \
+                        (op == "<" and current < target) or (op == "<=" and current <= target):
+                    hits |= postings
+        return hits
+
+    def query(self, expression: str) -> List[Tuple[str, Any]]:
+        expression = expression.strip()
+        hits = set(self.all)
+        # Optional leading entity, e.g. "persons where ..." or "Harms Summary where ..."
+        match = re.match(r"^(?P<entity>[\w ]+?)\s+(?:where|with)\s+(?P<rest>.+)$", expression, re.IGNORECASE)
+        if match:
+            entity = match.group("entity").lower().rstrip("s")
+            sections = [s for s in self.by_section if entity and entity in s]
+            if sections:
+                hits = set().union(*(self.by_section[s] for s in sections))
+            expression = match.group("rest")
+        for part in re.split(r"\s+and\s+", expression, flags=re.IGNORECASE):
+            condition = _CONDITION.match(part)
+            if condition:
+                hits &= self._condition(condition.group("field"), condition.group("op"), condition.group("value"))
+            else:
+                hits &= self._text_search(part)
+        return [(to_pointer(self.entries[i][0]), self.entries[i][1]) for i in sorted(hits)]
+
+
+# Rewrites of common phrasings into the query language
+_NATURAL_RULES = [
+    (re.compile(r"\b(asil|sil)\s+(\w+)\s+or\s+(higher|above|more|greater)\b", re.IGNORECASE), r"\1 >= \2"),
+    (re.compile(r"\b(asil|sil)\s+(\w+)\s+or\s+(lower|below|less)\b", re.IGNORECASE), r"\1 <= \2"),
+    (re.compile(r"\bat\s+least\s+(asil|sil)\s+(\w+)\b", re.IGNORECASE), r"\1 >= \2"),
+    (re.compile(r"\b(?:for|of)\s+(?:the\s+)?([A-Z][\w ]*?)\s*$"), r"and person = \1"),
+    (re.compile(r"\b(?:involving|containing|about|mentioning)\s+(.+)$", re.IGNORECASE), r"and text ~ \1"),
+]
+
+
+def natural_to_query(text: str) -> str:
+    query = text.strip().rstrip("?.")
+    query = re.sub(r"^(show|list|display|view|give me|which|what are)\s+(me\s+)?(all\s+)?(the\s+)?", "", query,
+                   flags=re.IGNORECASE)
+    for pattern, replacement in _NATURAL_RULES:
+        query = pattern.sub(replacement, query)
+    query = re.sub(r"^(\w+)\s+(?:with|where)\s+and\s+", r"\1 where ", query)
+    query = re.sub(r"^(\w+)\s+and\s+", r"\1 where ", query)
+    return re.sub(r"\s+(with|where)\s+(?=\w+\s*(>=|<=|=|~))", " where ", query)
+
+
+# Let the LLM write the query language for requests the rules do not cover
+def translate_query(request: str, fields: List[str], model: str = "openai:gpt-4o-mini") -> str:
+    messages = [
+        {"role": "system", "content": f"""
+        TASK:
+        - Translate the user's request into the query language below. Do not answer the request.
+
+        QUERY LANGUAGE:
+        - [entity] where <field> <op> <value> and <field> <op> <value> ...
+        - op is one of =, !=, >, >=, <, <=, ~ (text contains)
+        - Available fields: {fields}
+        - Examples: "hazards where ASIL >= C and person = Driver", "harms where text ~ crushing"
+
+        JSON FORMAT:
+        {{"query": "the query"}}
+        """},
+        {"role": "user", "content": request}
+    ]
+    response = run_chat(messages, model, "json")
+    return response.get("query", "") if isinstance(response, dict) else ""
+
+
+_index_cache: Optional[QueryIndex] = None
+_index_lock = threading.Lock()
+
+
+# answer_query runs on the feedback pipeline's worker threads, the cache is only read and replaced under the lock
+def get_index(analysis: Any) -> QueryIndex:
+    global _index_cache
+    with _index_lock:
+        index = _index_cache
+    if index is not None and index.analysis is analysis:
+        return index
+    index = QueryIndex(analysis)
+    with _index_lock:
+        _index_cache = index
+    return index
+
+
+# Answer a retrieval request: the query language first, then the phrasing rules, then the LLM translation
+def answer_query(request: str, analysis: Any, model: str = "openai:gpt-4o-mini") -> List[Tuple[str, Any]]:
+    index = get_index(analysis)
+    for candidate in (request, natural_to_query(request)):
+        try:
+            results = index.query(candidate)
+        except QueryError:
+            continue
+        if results:
+            return results
+    translated = translate_query(request, sorted(index.by_value), model)
+    try:
+        return index.query(translated) if translated else []
+    except QueryError as e:
+        print(f"Warning: Could not run translated query {translated!r}: {e}")
+        return []
@@ -0,0 +1,72 @@
+import math
+import re
+from typing import Any, Dict, List, Optional
+
+# Relevance ranking of the failure_mode x actuator x impact cells of HARA.collect_failures.
+# A cell scores high if the actuator was assigned to the impact class of the impact by define_actuators, and by the
+# word overlap between the actuator (with its impact class) and the impact. Cells are evaluated best first, so useful
+# failures arrive early and the long tail can be cut by top_k / max_cells or cancelled by the run budget.
+
+ASSOCIATION_WEIGHT = 0.6
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOP_WORDS = {"a", "an", "the", "of", "to", "by", "in", "on", "or", "and", "is", "are", "with", "from", "for",
+               "person", "persons", "system"}
+
+
+def _tokens(text: str) -> set:
+    return {word[:-1] if len(word) > 3 and word.endswith("s") else word
+            for word in _TOKEN.findall(str(text).lower()) if word not in _STOP_WORDS}
+
+
+def _similarity(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / math.sqrt(len(a) * len(b))
+
+
+# (impact class, impact) pairs from the impacts step ({impact class: [impact, ...]}) or a plain list of impacts
+def iter_impacts(impacts: Any) -> List[tuple]:
+    if isinstance(impacts, dict):
+        return [(impact_class, impact) for impact_class, impact_list in impacts.items() for impact in impact_list]
+    return [(impact.get("impact_class") if isinstance(impact, dict) else None, impact) for impact in impacts or ()]
+
+
+def impact_text(impact: Any) -> str:
+    if isinstance(impact, dict):
+        values = impact.get("physical_value", [])
+        values = values if isinstance(values, list) else [values]
+        return " ".join(str(v) for v in [impact.get("harm_caused", ""), *values])
+    return str(impact)
+
+
+def score_cell(actuator: str, actuator_class: Optional[str], impact_class: Optional[str], impact: Any) -> float:
+    associated = 1.0 if actuator_class and impact_class and \
+        actuator_class.strip().lower() == impact_class.strip().lower() else 0.0
+    lexical = _similarity(_tokens(f"{actuator} {actuator_class or ''}"),
+                          _tokens(impact_text(impact)))
+    return ASSOCIATION_WEIGHT * associated + (1 - ASSOCIATION_WEIGHT) * lexical
+
+
+# All cells, best first. top_k keeps the best impacts per actuator, max_cells cuts the ranked list.
+# For equal scores the failure modes alternate, so every failure mode is covered early.
+def rank_cells(failure_modes: List[Dict[str, str]], actuators: List[Dict[str, Any]], impacts: Any,
+               top_k: Optional[int] = None, max_cells: Optional[int] = None) -> List[Dict[str, Any]]:
+    impact_pairs = iter_impacts(impacts)
+    ranked_impacts = []
+    for entry in actuators or ():
+        for actuator in entry.get("actuators", []):
+            scored = sorted(((score_cell(actuator, entry.get("impact_class"), impact_class, impact), i)
+                             for i, (impact_class, impact) in enumerate(impact_pairs)),
+                            key=lambda pair: (-pair[0], pair[1]))
+            ranked_impacts.append((actuator, scored[:top_k] if top_k is not None else scored))
+
+    cells = []
+    for actuator, scored in ranked_impacts:
+        for score, i in scored:
+            for mode_index, failure_mode in enumerate(failure_modes):
+                cells.append({"failure_mode": failure_mode, "actuator": actuator, "impact": impact_pairs[i][1],
+                              "impact_class": impact_pairs[i][0], "score": score, "_order": (i, mode_index)})
+    cells.sort(key=lambda cell: (-cell["score"], cell["_order"]))
+    for cell in cells:
+        del cell["_order"]
+    return cells[:max_cells] if max_cells is not None else cells
@@ -1,13 +1,17 @@
-from typing import List, Dict
-import asyncio
-import aisuite as ai
-from dotenv import load_dotenv
+from typing import List, Dict, Optional
 import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from HELPERS import *
+from ROUTING import run_chat_cascade
+import ISO26262 as iso
+import IEC61508 as iec
+from MODEL import Rating
 
 
 # Step 1: Identify applicable safety standard and risk parameters
-def identify_standard_prompt(system_description: str, model: str) -> str:
+# Without an explicit model the fast model is tried first, see ROUTING.STEP_MODELS
+def identify_standard_prompt(system_description: str, model: str = None) -> str:
     messages = [
         {"role": "system", "content":
             f"""You are an expert functional safety engineer. Identify the relevant
@@ -37,9 +41,93 @@ def identify_standard_prompt(system_description: str, model: str) -> str:
             "standard which should not be provided in the JSON."
         }
     ]
+    if model is None:
+        return run_chat_cascade("identify_standard", messages, "json", system_description=system_description)
     return run_chat(messages, model=model, expected_format="json")
 
 
+# Background prefetch of the risk context. The standard and the injury statistics depend only on the system
+# description, so they are requested right after extract_system while the user works through the HARA, and kept per
+# system fingerprint. An edited system gets a new fingerprint and is fetched again.
+# run_chat turns failed requests into empty results, so every result is validated: a failed or invalid one is dropped
+# from the memo and requested again, up to PREFETCH_ATTEMPTS times.
+PREFETCH_ATTEMPTS = 3
+UNKNOWN_STANDARD = {"standard_name": "Unknown", "standard_reference": "Unknown"}
+_prefetch_executor: Optional[ThreadPoolExecutor] = None
+_prefetched: Dict[tuple, Future] = {}
+_prefetch_lock = threading.Lock()
+
+
+def _valid_standard(standard) -> bool:
+    return isinstance(standard, dict) and isinstance(standard.get("standard_reference"), str) and \
+        bool(standard["standard_reference"].strip())
+
+
+def _valid_injury_stats(injury_data) -> bool:
+    return iec.usable_injury_data(injury_data) is not iec.Injury_Data
+
+
+def _stop_prefetch():
+    if _prefetch_executor is not None:
+        _prefetch_executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Created on the first prefetch, so importing the module starts no threads. The shutdown hook runs before the
+# interpreter joins the executor threads (an atexit handler would run after), queued prefetches are dropped.
+def _executor() -> ThreadPoolExecutor:
+    global _prefetch_executor
+    if _prefetch_executor is None:
+        _prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="risk-prefetch")
+        threading._register_atexit(_stop_prefetch)
+    return _prefetch_executor
+
+
+def _prefetch(kind: str, function, system_description) -> Future:
+    key = (kind, system_fingerprint(system_description))
+    with _prefetch_lock:
+        future = _prefetched.get(key)
+        if future is None:
+            future = _executor().submit(function, system_description)
+            _prefetched[key] = future
+    return future
+
+
+# The validated prefetch result; after PREFETCH_ATTEMPTS failures the last result (or None) is returned
+def _fetched(kind: str, function, system_description, valid):
+    key = (kind, system_fingerprint(system_description))
+    result = None
+    for _ in range(PREFETCH_ATTEMPTS):
+        future = _prefetch(kind, function, system_description)
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Error prefetching {kind}: {e}")
+            result = None
+        if valid(result):
+            return result
+        with _prefetch_lock:
+            if _prefetched.get(key) is future:
+                del _prefetched[key]
+    print(f"Warning: No valid {kind} after {PREFETCH_ATTEMPTS} attempts.")
+    return result
+
+
+def prefetch_risk_context(system_description) -> None:
+    _prefetch("standard", identify_standard_prompt, system_description)
+    _prefetch("injury_stats", iec.get_injury_stats, system_description)
+
+
+# The identified standard of the system, from the prefetch if it was started. Always has a standard_reference.
+def identified_standard(system_description) -> Dict:
+    standard = _fetched("standard", identify_standard_prompt, system_description, _valid_standard)
+    return standard if _valid_standard(standard) else dict(UNKNOWN_STANDARD)
+
+
+# Incomplete statistics are returned as they are, the IEC 61508 assessment replaces them by its defaults
+def injury_stats(system_description) -> List:
+    return _fetched("injury_stats", iec.get_injury_stats, system_description, _valid_injury_stats)
+
+
 # DO WE WANT TO USE THE RISK PARAMETERS OF THE STANDARD OR THE 4?
 # Step 2: For each hazard/failure, prompt LLM to assign risk parameters with reasoning
 def risk_parameters_prompt(hazard_list: List[Dict], standard: str, model: str) -> List[Dict]:
@@ -143,6 +231,52 @@ def run_risk_assessment(system_description: str, hazard_list: List[Dict], model:
     }
 
 
+MULTI_STANDARDS = ("ISO 26262", "IEC 61508")
+
+
+# Side-by-side rows of the assessments, aligned by the position of the hazard in the harms list
+def align_assessments(hazard_list: List, assessments: Dict[str, List]) -> List[Dict]:
+    rows = []
+    for i, hazard in enumerate(hazard_list):
+        row = {"hazard": hazard}
+        iso_result = assessments.get("ISO 26262", [])
+        if i < len(iso_result) and isinstance(iso_result[i], dict):
+            rating = Rating.from_iso(iso_result[i])
+            row["ISO 26262"] = {key: f"{key}{level}" if level is not None else "?"
+                                for key, level in rating.parameters.items()}
+            row["ISO 26262"]["ASIL"] = iso_result[i].get("ASIL", "UNKNOWN")
+        iec_result = assessments.get("IEC 61508", [])
+        if i < len(iec_result) and isinstance(iec_result[i], dict):
+            cleaned = iec.normalize_hazard_data([iec_result[i]])
+            row["IEC 61508"] = {key: cleaned[0][key] for key in ("C", "F", "P")} if cleaned else {}
+            row["IEC 61508"]["SIL"] = iec_result[i].get("SIL", "UNKNOWN")
+        rows.append(row)
+    return rows
+
+
+# Assess the same harms with several standards in parallel. The harm / situation / avoidance context of every hazard
+# is extracted once and shared: the factorised ISO 26262 rating reads it from its cache, IEC 61508 gets it in the
+# prompt. The injury statistics of IEC 61508 come from the prefetch or are fetched inside its own thread.
+def run_multi_standard(system_description: str, hazard_list: List, standards=MULTI_STANDARDS,
+                       model: str = "openai:gpt-4o-mini") -> Dict:
+    contexts = iso.extract_factors(hazard_list, model)
+    backends = {
+        "ISO 26262": lambda: iso.run_risk_assessment(hazard_list, model=model, factorised=True),
+        "IEC 61508": lambda: iec.IECAssessment(injury_stats(system_description), model=model).run(hazard_list,
+                                                                                                   contexts),
+    }
+    assessments = {}
+    with ThreadPoolExecutor(max_workers=len(standards)) as executor:
+        futures = {standard: executor.submit(backends[standard]) for standard in standards if standard in backends}
+        for standard, future in futures.items():
+            try:
+                assessments[standard] = future.result()
+            except Exception as e:
+                print(f"Warning: {standard} assessment failed: {e}")
+                assessments[standard] = []
+    return {"assessments": assessments, "comparison": align_assessments(hazard_list, assessments)}
+
+
 def synthesize_consensus(results_list: List[Dict], judge_model: str = "openai:gpt-4o") -> Dict[str, str]:
     """
     Takes N result dictionaries, compares them, and keeps only the findings
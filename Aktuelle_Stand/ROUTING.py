@@ -0,0 +1,67 @@
+import re
+from typing import Any, Callable, Dict, List, Optional
+from HELPERS import run_chat
+
+STRONG_MODEL = "openai:gpt-5.2"
+FAST_MODEL = "openai:gpt-4o-mini"
+
+# Models tried per step, cheapest first. The last model's answer is always accepted.
+STEP_MODELS: Dict[str, List[str]] = {
+    "query_detection": [FAST_MODEL, STRONG_MODEL],
+    "identify_standard": [FAST_MODEL, STRONG_MODEL],
+}
+
+QUERY_TYPES = {"delete", "get", "post", "refactor", "clarification"}
+
+# Keywords which make a query type obvious, used to check the fast model's classification
+QUERY_HINTS = {
+    "delete": re.compile(r"\b(delete|remove|drop|erase)\b", re.IGNORECASE),
+    "post": re.compile(r"\b(add|insert|generate|create|append)\b", re.IGNORECASE),
+    "get": re.compile(r"\b(show|list|display|view|which|what)\b", re.IGNORECASE),
+    "refactor": re.compile(r"\b(rename|change|correct|update|replace|fix|improve)\b", re.IGNORECASE),
+}
+
+AUTOMOTIVE_HINTS = re.compile(r"\b(vehicle|car|truck|driver|brake|steering|road|automotive)\b", re.IGNORECASE)
+KNOWN_STANDARD = re.compile(r"\b(IEC|ISO|EN|DIN|UL)\s?\d{3,5}\b")
+
+
+def validate_query_detection(result: Any, user_query: str = "", **context) -> bool:
+    if not isinstance(result, dict) or result.get("type") not in QUERY_TYPES:
+        return False
+    if not isinstance(result.get("content"), str) or not result["content"].strip():
+        return False
+    # Escalate if exactly one keyword class matches the query and the fast model disagrees with it
+    hinted = [label for label, pattern in QUERY_HINTS.items() if pattern.search(user_query)]
+    if len(hinted) == 1 and result["type"] not in (hinted[0], "clarification"):
+        return False
+    return True
+
+
+def validate_standard(result: Any, system_description: str = "", **context) -> bool:
+    if not isinstance(result, dict):
+        return False
+    reference = str(result.get("standard_reference", ""))
+    if not KNOWN_STANDARD.search(reference) or not result.get("standard_name"):
+        return False
+    # Road vehicles and ISO 26262 should go together, anything else needs the strong model's judgement
+    return bool(AUTOMOTIVE_HINTS.search(str(system_description))) == ("26262" in reference)
+
+
+STEP_VALIDATORS: Dict[str, Callable[..., bool]] = {
+    "query_detection": validate_query_detection,
+    "identify_standard": validate_standard,
+}
+
+
+# Try the step's models from cheapest to strongest and return the first answer that passes the step's validator
+def run_chat_cascade(step: str, messages: list, expected_format: str = "json", models: Optional[List[str]] = None,
+                     **context) -> Any:
+    models = models or STEP_MODELS.get(step, [STRONG_MODEL])
+    validate = STEP_VALIDATORS.get(step)
+    result = None
+    for i, model in enumerate(models):
+        result = run_chat(messages, model, expected_format)
+        if i == len(models) - 1 or validate is None or validate(result, **context):
+            return result
+        print(f"--- {step}: answer of {model} rejected, escalating to {models[i + 1]}")
+    return result
@@ -0,0 +1,233 @@
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+from MODEL import Rating
+from ISO26262 import ASIL_MATRIX
+import IEC61508 as iec
+
+# Sensitivity and Monte Carlo analysis of ASIL (ISO 26262) and SIL (IEC 61508) assignments.
+# Every risk parameter of a hazard gets a probability distribution over its levels, either from repeated LLM ratings
+# or from a +-1 perturbation of the single rating. Levels map to an integrity level through a lookup table (ASIL_MATRIX
+# or the risk graph), so the integrity level distribution of all hazards is an einsum over the tables (exact) or
+# a table lookup on sampled level arrays (Monte Carlo), both in bulk with NumPy.
+
+# Number of levels per parameter including level 0, e.g. S0..S3
+ISO_LEVELS = {"S": 4, "E": 5, "C": 4}
+IEC_LEVELS = {"C": 5, "F": 4, "P": 3}
+ASIL_CODES = ["-", "QM", "A", "B", "C", "D"]
+SIL_CODES = ["-", 1, 2, 3, 4, "P"]
+# Lowest meaningful level per parameter, unknown parameters are spread evenly from there
+ISO_MIN_LEVEL = {"S": 0, "E": 0, "C": 0}
+IEC_MIN_LEVEL = {"C": 1, "F": 1, "P": 1}
+
+PERTURBATION = 0.05
+FRAGILITY_THRESHOLD = 0.7
+MC_CHUNK_CELLS = 20_000_000
+
+
+# The analysis is optional, NumPy is imported on first use and the rest of the tool runs without it
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("The sensitivity analysis requires NumPy: pip install numpy")
+    return numpy
+
+
+def asil_table():
+    np = _numpy()
+    table = np.zeros([ISO_LEVELS[key] for key in ("S", "E", "C")], dtype=np.int8)
+    for (s, e, c), asil in ASIL_MATRIX.items():
+        table[s, e, c] = ASIL_CODES.index(asil)
+    return table
+
+
+# SIL codes from a risk graph {CFPW number: [.., .., .., SIL]}, W is fixed to W3 (1) as in IEC61508.risk_assessment
+def sil_table(risk_graph: Mapping[int, Sequence[int]]):
+    np = _numpy()
+    table = np.zeros([IEC_LEVELS[key] for key in ("C", "F", "P")], dtype=np.int8)
+    for c in range(IEC_LEVELS["C"]):
+        for f in range(IEC_LEVELS["F"]):
+            for p in range(IEC_LEVELS["P"]):
+                sil = risk_graph.get(c * 1000 + f * 100 + p * 10 + 1, [0, 0, 0, 0])[3]
+                table[c, f, p] = SIL_CODES.index("P") if sil == 10 else sil
+    return table
+
+
+# (N, size) distributions from point levels: the level keeps 1 - spread per existing neighbour, each neighbour gets
+# spread. Unknown levels (-1) are spread evenly over minimum..size-1.
+def point_distribution(levels, size: int, spread: float = PERTURBATION, minimum: int = 0):
+    np = _numpy()
+    levels = np.asarray(levels, dtype=np.int64)
+    n = len(levels)
+    distribution = np.zeros((n, size))
+    known = levels >= 0
+    rows = np.nonzero(known)[0]
+    distribution[rows, levels[known]] = 1.0
+    for step in (-1, 1):
+        neighbour = levels[known] + step
+        inside = (neighbour >= minimum) & (neighbour < size)
+        distribution[rows[inside], neighbour[inside]] += spread
+        distribution[rows[inside], levels[known][inside]] -= spread
+    distribution[~known, minimum:] = 1.0 / (size - minimum)
+    return distribution
+
+
+# (N, size) empirical distributions from repeated ratings, samples[i] are the levels rated for hazard i
+def sample_distribution(samples: Sequence[Sequence[Optional[int]]], size: int, minimum: int = 0):
+    np = _numpy()
+    distribution = np.zeros((len(samples), size))
+    for i, levels in enumerate(samples):
+        for level in levels:
+            if level is not None and minimum <= level < size:
+                distribution[i, level] += 1
+        total = distribution[i].sum()
+        if total:
+            distribution[i] /= total
+        else:
+            distribution[i, minimum:] = 1.0 / (size - minimum)
+    return distribution
+
+
+# Exact (N, codes) integrity level distribution of three independent parameters
+def exact_distribution(table, distributions: List, codes: int):
+    np = _numpy()
+    joint = np.einsum("ni,nj,nk->nijk", *distributions)
+    one_hot = np.eye(codes)[table]  # (i, j, k, codes)
+    return np.einsum("nijk,ijkc->nc", joint, one_hot)
+
+
+# Monte Carlo estimate of the (N, codes) distribution, hazards are processed in chunks to bound the memory
+def monte_carlo(table, distributions: List, codes: int, samples: int = 10_000, seed: Optional[int] = None):
+    np = _numpy()
+    rng = np.random.default_rng(seed)
+    n = distributions[0].shape[0]
+    result = np.zeros((n, codes))
+    chunk = max(1, MC_CHUNK_CELLS // max(samples, 1))
+    cumulative = [np.cumsum(d, axis=1).astype(np.float32) for d in distributions]
+    for start in range(0, n, chunk):
+        stop = min(start + chunk, n)
+        levels = []
+        for cum in cumulative:
+            u = rng.random((stop - start, samples), dtype=np.float32)
+            # Inverse CDF: count the cumulative bounds below u
+            level = np.zeros((stop - start, samples), dtype=np.int8)
+            for bound in range(cum.shape[1] - 1):
+                level += u >= cum[start:stop, bound, None]
+            levels.append(level)
+        drawn = table[levels[0], levels[1], levels[2]]
+        rows = np.arange(stop - start)[:, None] * codes
+        counts = np.bincount((rows + drawn).ravel(), minlength=(stop - start) * codes)
+        result[start:stop] = counts.reshape(stop - start, codes) / samples
+    return result
+
+
+# Integrity level when one parameter moves one level down or up: (N, parameters, 2) codes
+def one_at_a_time(table, levels: List, minimums: Sequence[int]):
+    np = _numpy()
+    levels = [np.asarray(level, dtype=np.int64) for level in levels]
+    shifted = np.zeros((len(levels[0]), len(levels), 2), dtype=np.int8)
+    for p, minimum in enumerate(minimums):
+        for side, step in enumerate((-1, 1)):
+            moved = [level.copy() for level in levels]
+            moved[p] = np.clip(moved[p] + step, minimum, table.shape[p] - 1)
+            shifted[:, p, side] = table[moved[0], moved[1], moved[2]]
+    return shifted
+
+
+def _analyse(table, names: List[str], point_levels: List, distributions: List, code_names: List, minimums: List,
+             samples: Optional[int], threshold: float, seed: Optional[int]) -> List[Dict[str, Any]]:
+    np = _numpy()
+    codes = len(code_names)
+    if samples:
+        distribution = monte_carlo(table, distributions, codes, samples, seed)
+    else:
+        distribution = exact_distribution(table, distributions, codes)
+    known = np.all([level >= 0 for level in point_levels], axis=0)
+    point = table[tuple(np.maximum(level, 0) for level in point_levels)]
+    point = np.where(known, point, distribution.argmax(axis=1))
+    shifted = one_at_a_time(table, [np.maximum(level, 0) for level in point_levels], minimums)
+    sensitive = np.any(shifted != point[:, None, None], axis=2) & known[:, None]
+    stability = distribution[np.arange(len(point)), point]
+    results = []
+    for i in range(len(point)):
+        results.append({
+            "point": code_names[point[i]],
+            "stability": round(float(stability[i]), 4),
+            "fragile": bool(stability[i] < threshold),
+            "sensitive_to": [name for p, name in enumerate(names) if sensitive[i, p]],
+            "distribution": {str(code_names[c]): round(float(distribution[i, c]), 4)
+                             for c in range(codes) if distribution[i, c] > 0},
+        })
+    return results
+
+
+def _levels(ratings: List[Rating], names: List[str]):
+    np = _numpy()
+    return [np.array([r.parameters.get(name) if r.parameters.get(name) is not None else -1 for r in ratings])
+            for name in names]
+
+
+# Analyse rated ISO 26262 hazards (evaluate_hazards format). repeats[i] optionally holds repeated ratings of hazard i,
+# otherwise the +-1 perturbation is used. samples=None computes the exact distribution instead of Monte Carlo.
+def analyse_iso(hazards: List[Dict], repeats: Optional[List[List[Dict]]] = None, spread: float = PERTURBATION,
+                samples: Optional[int] = None, threshold: float = FRAGILITY_THRESHOLD,
+                seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    _numpy()
+    names = list(ISO_LEVELS)
+    point_levels = _levels([Rating.from_iso(h) for h in hazards], names)
+    if repeats is not None:
+        sampled = [[Rating.from_iso(r) for r in rs] for rs in repeats]
+        distributions = [sample_distribution([[r.parameters.get(n) for r in rs] for rs in sampled], ISO_LEVELS[n],
+                                             ISO_MIN_LEVEL[n]) for n in names]
+    else:
+        distributions = [point_distribution(level, ISO_LEVELS[n], spread, ISO_MIN_LEVEL[n])
+                         for level, n in zip(point_levels, names)]
+    results = _analyse(asil_table(), names, point_levels, distributions, ASIL_CODES,
+                       [ISO_MIN_LEVEL[n] for n in names], samples, threshold, seed)
+    for hazard, result in zip(hazards, results):
+        result["hazard"] = hazard.get("hazard", "")
+    return results
+
+
+# Same for IEC 61508 hazards (risk_assessment format) against a risk graph, by default the one IEC61508 computes
+def analyse_iec(hazards: List[Dict], risk_graph: Optional[Mapping[int, Sequence[int]]] = None,
+                repeats: Optional[List[List[Dict]]] = None, spread: float = PERTURBATION,
+                samples: Optional[int] = None, threshold: float = FRAGILITY_THRESHOLD,
+                seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    _numpy()
+    if risk_graph is None:
+        risk_graph = iec.calculate_risk_graph()
+    names = list(IEC_LEVELS)
+    point_levels = _levels([Rating.from_iec(h) for h in hazards], names)
+    if repeats is not None:
+        sampled = [[Rating.from_iec(r) for r in rs] for rs in repeats]
+        distributions = [sample_distribution([[r.parameters.get(n) for r in rs] for rs in sampled], IEC_LEVELS[n],
+                                             IEC_MIN_LEVEL[n]) for n in names]
+    else:
+        distributions = [point_distribution(level, IEC_LEVELS[n], spread, IEC_MIN_LEVEL[n])
+                         for level, n in zip(point_levels, names)]
+    results = _analyse(sil_table(risk_graph), names, point_levels, distributions, SIL_CODES,
+                       [IEC_MIN_LEVEL[n] for n in names], samples, threshold, seed)
+    for hazard, result in zip(hazards, results):
+        result["hazard"] = hazard.get("hazard", "")
+    return results
+
+
+def benchmark(hazards: int = 10_000, samples: int = 10_000):
+    np = _numpy()
+    rng = np.random.default_rng(0)
+    rated = [{"hazard": f"Hazard {i}", "Severity": f"S{s}", "Exposure": f"E{e}", "Controllability": f"C{c}"}
+             for i, (s, e, c) in enumerate(zip(rng.integers(1, 4, hazards), rng.integers(1, 5, hazards),
+                                               rng.integers(1, 4, hazards)))]
+    start = time.perf_counter()
+    exact = analyse_iso(rated)
+    print(f"Exact:       {hazards} hazards in {time.perf_counter() - start:.2f}s")
+    start = time.perf_counter()
+    sampled = analyse_iso(rated, samples=samples, seed=0)
+    print(f"Monte Carlo: {hazards} hazards x {samples} samples in {time.perf_counter() - start:.2f}s")
+    deviation = max(abs(exact[i]["stability"] - sampled[i]["stability"]) for i in range(hazards))
+    print(f"Fragile: {sum(r['fragile'] for r in exact)} of {hazards}, max. Monte Carlo deviation {deviation:.4f}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -4,13 +4,39 @@ import FILE_SEARCH as fs
 import json
 import IEC61508 as iec
 import ISO26262 as iso
-from rich.console import Console
+import HISTORY
+from HELPERS import prewarm_connections
 from concurrent.futures import ThreadPoolExecutor
 
+# Draft mode: extract the first HARA steps with one request instead of four
+FUSED_SETUP = False
+# Assess the harms with ISO 26262 and IEC 61508 side by side instead of the identified standard only
+MULTI_STANDARD = False
+
 def feedback(final_data: json, backend, hara_step):
-    previous_querys = []
-    query_history = []
+    # Queries are classified and applied in the background while the next one is typed
+    pipeline = fs.FeedbackPipeline(final_data, backend, apply_each=hara_step != "Hazard Classes")
+    from rich.console import Console
+    console = Console()
+    finished = False
     while True:
+        needs_clarification = False
+        for user_query, response in pipeline.completed(block=finished):
+            console.print(response["type"])
+            if response["type"] == "get":
+                for pointer, entry in response.get("answer", []):
+                    console.print(f"{pointer}: {json.dumps(entry)}")
+                if not response.get("answer"):
+                    console.print("No matching entries found.")
+            elif response["type"] == "clarification":
+                needs_clarification = True
+                user_query = input("The system seems to be confused about your query could you please refine it:\n" +
+                                   response["content"] + "\n")
+                pipeline.submit(user_query)
+        if finished:
+            if not needs_clarification:
+                break
+            continue
         if backend == "HARA":
             user_query = input(f"\nEnter what you would like to modify about the HARA step: {hara_step} or enter U if "
                                f"you want to trigger the modification.\n")
@@ -18,49 +44,65 @@ def feedback(final_data: json, backend, hara_step):
             user_query = input(f"\nEnter what you would like to modify about the RISK_ASSESSMENT or enter U if you want"
                                f" to trigger the modification.\n")
         if user_query.lower() == "u":
-            break
+            finished = True
         elif user_query.lower() == "x":
-            return json
-        response = fs.query_detection_LLM(user_query, final_data, previous_querys, task_description=backend)
-        console = Console()
-        console.print(response["type"])
-        while response["type"] == "clarification":
-            user_query = input("The system seems to be confused about your query could you please refine it:\n" +
-                               response["content"] + "\n")
-            response = fs.query_detection_LLM(user_query, final_data, previous_querys, "HARA")
-        query_history.append(response)
-        previous_querys.append(user_query)
-
-    if len(query_history) > 0:
-        if hara_step == "Hazard Classes":
-            return fs.complete_querys(query_history, final_data, hazards=True)
+            pipeline.cancel()
+            return final_data
         else:
-            return fs.complete_querys(query_history, final_data)
+            pipeline.submit(user_query)
+
+    return pipeline.result()
+
+def display_step(data: json, hara_step):
+    if hara_step == "System Under Analysis":
+        h.display_system(data)
+    elif hara_step == "Persons At Risk":
+        h.display_persons(data)
+    elif hara_step == "Hazard Classes":
+        h.display_hazards(list(data.keys()) if isinstance(data, dict) else data)
+    elif hara_step == "Harms Summary":
+        h.display_harms(data)
+    elif hara_step == "Impact Classes":
+        h.display_impacts(data)
+    elif hara_step == "Failure Modes":
+        h.display_failure_modes(data)
     else:
-        return final_data
+        h.display_actuators(data)
 
 def modify_request_cycle(to_modify : json, backend, hara_step):
+    # Every modification is a new version sharing its unchanged parts with the previous one
+    history = HISTORY.History(to_modify)
     while True:
-        change_requested = input(f"Would like to modify {hara_step} (y/n)?\n")
-        if change_requested.lower() == "y":
-            modified = feedback(to_modify, backend, hara_step)
-            if hara_step == "System Under Analysis":
-                h.display_system(modified)
-            elif hara_step == "Persons At Risk":
-                h.display_persons(modified)
-            elif hara_step == "Hazard Classes":
-                h.display_hazards(list(modified.keys()))
-            elif hara_step == "Harms Summary":
-                h.display_harms(modified)
-            elif hara_step == "Impact Classes":
-                h.display_impact_classes(modified)
-            elif hara_step == "Failure Modes":
-                h.display_failure_modes(modified)
-            else:
-                h.display_actuators(modified)
-            return modify_request_cycle(to_modify, backend, hara_step)
+        change_requested = input(f"Would like to modify {hara_step} (y/n, undo/redo)?\n").lower()
+        if change_requested == "y":
+            history.commit(feedback(history.current, backend, hara_step))
+        elif change_requested == "undo" and history.can_undo():
+            history.undo()
+        elif change_requested == "redo" and history.can_redo():
+            history.redo()
+        elif change_requested in ("undo", "redo"):
+            print(f"Nothing to {change_requested}.")
+            continue
         else:
-            return to_modify
+            return history.current
+        display_step(history.current, hara_step)
+
+def display_comparison(comparison):
+    from rich.console import Console
+    from rich.table import Table
+    table = Table(title="ISO 26262 / IEC 61508 Comparison", show_header=True, header_style="bold magenta")
+    table.add_column("Hazard", style="dim", justify="left")
+    table.add_column("S / E / C", justify="center")
+    table.add_column("ASIL", style="bold yellow", justify="center")
+    table.add_column("C / F / P", justify="center")
+    table.add_column("SIL", style="bold yellow", justify="center")
+    for row in comparison:
+        iso_row = row.get("ISO 26262", {})
+        iec_row = row.get("IEC 61508", {})
+        table.add_row(str(row["hazard"]),
+                      " / ".join(str(iso_row.get(key, "?")) for key in ("S", "E", "C")), str(iso_row.get("ASIL", "-")),
+                      " / ".join(str(iec_row.get(key, "?")) for key in ("C", "F", "P")), str(iec_row.get("SIL", "-")))
+    Console().print(table)
 
 def person_thread(system):
     return h.extract_persons(system, model="openai:gpt-5.2")
@@ -70,7 +112,7 @@ def hazard_thread(system):
     return h.extract_hazards(system, model="openai:gpt-5.2")
 
 def impact_classes_thread(system):
-    return h.extract_impact_classes(system, model="openai:gpt-5.2")
+    return h.extract_iclasses(system, model="openai:gpt-5.2")
 
 def failure_modes_thread(system):
     return h.identify_failure_modes(system, model="openai:gpt-5.2")
@@ -78,32 +120,37 @@ def failure_modes_thread(system):
 def actuators_thread(system, impact_classes):
     return h.define_actuators(system, impact_classes, model="openai:gpt-5.2")
 
+# Persons, hazards, impact classes and failure modes, either from one fused request or from one request each
+def setup_thread(system):
+    if FUSED_SETUP:
+        setup = h.extract_setup(system, model="openai:gpt-5.2")
+        return setup["persons"], setup["hazards"], setup["impact_classes"], setup["failure_modes"]
+    with ThreadPoolExecutor() as executor:
+        futures = [executor.submit(step, system) for step in
+                   (person_thread, hazard_thread, impact_classes_thread, failure_modes_thread)]
+        return tuple(future.result() for future in futures)
+
 def main():
+    # Connect to the providers while the system description is being entered
+    prewarm_connections()
     system = ("""Electronic Parking Brake Description: The system replaces the traditional mechanical handbrake 
     lever. It utilizes electromechanical actuators to lock the rear wheels, securing the vehicle against rolling 
     away when stationary. Additionally, it provides a secondary emergency braking function while the vehicle 
     is in motion.""")
 
     system = h.extract_system(system, model="openai:gpt-5.2")
+    # The risk assessment only needs the system, its context is fetched during the HARA
+    ra.prefetch_risk_context(system)
     h.display_system(system)
 
     with ThreadPoolExecutor() as executor:
-        person_future = executor.submit(person_thread, system)
-        hazard_future = executor.submit(hazard_thread, system)
-        impact_future = executor.submit(hazard_thread, system)
-        failure_modes_future = executor.submit(failure_modes_thread, system)
+        setup_future = executor.submit(setup_thread, system)
         new_system = modify_request_cycle(system, "HARA", "System Under Analysis")
-        persons = person_future.result()
-        hazards = hazard_future.result()
-        impact_classes = impact_future.result()
-        failure_modes = failure_modes_future.result()
+        persons, hazards, impact_classes, failure_modes = setup_future.result()
 
     if system != new_system:
-        with ThreadPoolExecutor() as executor:
-            persons = executor.submit(person_thread, new_system)
-            hazards = executor.submit(hazard_thread, new_system)
-            impact_classes = executor.submit(hazard_thread, new_system)
-            failure_modes = executor.submit(failure_modes_thread, new_system)
+        ra.prefetch_risk_context(new_system)
+        persons, hazards, impact_classes, failure_modes = setup_thread(new_system)
         system = new_system
 
     h.display_persons(persons)
@@ -111,7 +158,8 @@ def main():
     h.display_hazards(hazards)
     hazards = modify_request_cycle(hazards, "HARA", "Hazard Classes")
 
-    harms_dict = h.harms(system, persons, hazards, model="openai:gpt-5.2")
+    pruned_cells = []
+    harms_dict = h.harms(system, persons, hazards, model="openai:gpt-5.2", prune=True, pruned_cells=pruned_cells)
     harms_summary_list = h.harms_summary(harms_dict, model="openai:gpt-5.2")
     h.display_harms(harms_summary_list)
     harms_summary_list = modify_request_cycle(harms_summary_list, "HARA", "Harms Summary")
@@ -134,6 +182,7 @@ def main():
     final_hara["System Under Analysis"] = system
     final_hara["Persons At Risk"] = persons
     final_hara["Hazards"] = hazards
+    final_hara["Pruned Person x Hazard Cells"] = pruned_cells
     final_hara["Harms Summary"] = harms_summary_list
     final_hara["Impact"] = impacts_dict
     final_hara["Failure Modes"] = failure_modes
@@ -141,10 +190,15 @@ def main():
     fs.save_file(final_hara, "FINAL_HARA.json")
     print("Saved to HARA!\n")
 
-    standard = ra.identify_standard_prompt(system, model="openai:gpt-5.2")
-    if standard["standard_reference"] == "IEC 61508":
+    standard = None if MULTI_STANDARD else ra.identified_standard(system)
+    if MULTI_STANDARD:
+        # Both standards side by side, the feedback below refines the aligned result
+        final_risk_assessment = ra.run_multi_standard(system, harms_summary_list, model="openai:gpt-5.2")
+        display_comparison(final_risk_assessment["comparison"])
+    elif standard["standard_reference"] == "IEC 61508":
         print("IEC 61508")
-        final_risk_assessment = iec.run_risk_assessment(harms_summary_list, system)
+        final_risk_assessment = iec.run_risk_assessment(harms_summary_list, system,
+                                                        injury_data=ra.injury_stats(system))
     elif standard["standard_reference"] == "ISO 26262":
         print("ISO 26262")
         final_risk_assessment = iso.run_risk_assessment(harms_summary_list, model="openai:gpt-5.2")
@@ -154,9 +208,17 @@ def main():
 
     print("\n======== AUTOMATICALLY GENERATED RISK ASSESSMENT ========\n")
     print(json.dumps(final_risk_assessment, indent=4))
-    final_risk_assessment = feedback(final_risk_assessment, "RISK", "")
+    if MULTI_STANDARD:
+        # Only the assessments are editable, the comparison is derived from them again afterwards
+        assessments = feedback(final_risk_assessment["assessments"], "RISK", "")
+        final_risk_assessment = {"assessments": assessments,
+                                 "comparison": ra.align_assessments(harms_summary_list, assessments)}
+    else:
+        final_risk_assessment = feedback(final_risk_assessment, "RISK", "")
     print("\n======== RISK ASSESSMENT AFTER PROCESSING THE USERS FEEDBACK  ========\n")
     print(json.dumps(final_risk_assessment, indent=4))
+    if MULTI_STANDARD:
+        display_comparison(final_risk_assessment["comparison"])
 
     fs.save_file(final_risk_assessment, "RISK_ASSESSMENT.json")
     print("Saved to risk assessment!\n")